@@ -1,48 +1,158 @@
+from django.conf import settings
 from django.contrib import admin
-from .models import Project, Task, Document, Comment, TimelineEvent, Notification
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.utils.functional import cached_property
+from .models import Project, Task, RecurringTaskTemplate, Document, Comment, TimelineEvent, Notification
+
+
+def estimated_row_count(model, using):
+    """Planner estimate of the table size on Postgres (summed over partitions), else None."""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT COALESCE(SUM(GREATEST(reltuples, 0)), 0)::bigint FROM pg_class "
+            "WHERE oid = %s::regclass OR oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass)",
+            [model._meta.db_table, model._meta.db_table]
+        )
+        return cursor.fetchone()[0]
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Uses the planner's row estimate instead of COUNT(*) for unfiltered
+    changelists of large tables. Filtered lists are still counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > settings.ADMIN_EXACT_COUNT_LIMIT:
+                return estimate
+        return super().count
+
+
+class RelatedIdFilter(admin.SimpleListFilter):
+    """
+    Filters on a foreign key by id typed into a box, instead of a sidebar
+    listing every related row.
+    """
+    template = 'admin/project_app/id_filter.html'
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if not value:
+            return queryset
+        if not value.isdigit():
+            raise IncorrectLookupParameters(f"Invalid id: {value}")
+        return queryset.filter(**{self.parameter_name: value})
+
+    def choices(self, changelist):
+        yield {
+            'value': self.value() or '',
+            'parameter_name': self.parameter_name,
+            'clear_query_string': changelist.get_query_string(remove=[self.parameter_name]),
+            # keep the other filters, the search and the ordering when submitting
+            'hidden': [(key, value) for key, value in changelist.params.items() if key != self.parameter_name],
+        }
+
+
+def id_filter(field, title):
+    return type(f'{field.title()}IdFilter', (RelatedIdFilter,), {'title': title, 'parameter_name': f'{field}_id'})
+
+
+ProjectIdFilter = id_filter('project', 'project id')
+TaskIdFilter = id_filter('task', 'task id')
+UserIdFilter = id_filter('user', 'user id')
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # skip the second, unfiltered COUNT(*) shown next to filtered results
+    show_full_result_count = False
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        # the models' delete() writes the sync tombstones, queryset.delete() does not
+        for obj in queryset:
+            obj.delete()
+
 
 @admin.register(Project)
-class ProjectAdmin(admin.ModelAdmin):
+class ProjectAdmin(LargeTableAdmin):
     list_display = ('name', 'description', 'created_at', 'updated_at')
-    search_fields = ('name', 'description')
+    search_fields = ('^name',)
+    autocomplete_fields = ('created_by', 'members')
     ordering = ('-created_at',)
 
 
 @admin.register(Task)
-class TaskAdmin(admin.ModelAdmin):
+class TaskAdmin(LargeTableAdmin):
     list_display = ('title', 'project', 'assigned_to', 'status', 'created_at', 'updated_at')
-    search_fields = ('title', 'description')
-    list_filter = ('status', 'project')
+    list_select_related = ('project', 'assigned_to')
+    search_fields = ('^title',)
+    list_filter = ('status', ProjectIdFilter)
+    autocomplete_fields = ('project', 'assigned_to', 'created_by')
+    ordering = ('-id',)
+
+
+@admin.register(RecurringTaskTemplate)
+class RecurringTaskTemplateAdmin(LargeTableAdmin):
+    list_display = ('title', 'schedule', 'is_active', 'generated_until', 'created_by')
+    list_select_related = ('created_by',)
+    search_fields = ('^title',)
+    list_filter = ('is_active',)
+    autocomplete_fields = ('projects', 'assigned_to', 'created_by')
     ordering = ('-created_at',)
 
 
 @admin.register(Document)
-class DocumentAdmin(admin.ModelAdmin):
+class DocumentAdmin(LargeTableAdmin):
     list_display = ('name', 'project', 'uploaded_by', 'created_at', 'updated_at')
-    search_fields = ('name', 'description')
-    list_filter = ('project',)
-    ordering = ('-created_at',)
+    list_select_related = ('project', 'uploaded_by')
+    search_fields = ('^name',)
+    list_filter = (ProjectIdFilter,)
+    autocomplete_fields = ('project', 'uploaded_by')
+    ordering = ('-id',)
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(LargeTableAdmin):
     list_display = ('author', 'task', 'created_at', 'updated_at')
-    search_fields = ('content',)
-    list_filter = ('task',)
-    ordering = ('-created_at',)
+    # Task.__str__ includes the project name
+    list_select_related = ('author', 'task__project')
+    search_fields = ('author__username__exact',)
+    list_filter = (TaskIdFilter,)
+    autocomplete_fields = ('author', 'project', 'task')
+    ordering = ('-id',)
 
 
 @admin.register(TimelineEvent)
-class TimelineEventAdmin(admin.ModelAdmin):
+class TimelineEventAdmin(LargeTableAdmin):
     list_display = ('project', 'event_type', 'user', 'created_at')
-    search_fields = ('description',)
-    list_filter = ('event_type', 'project')
+    list_select_related = ('project', 'user')
+    search_fields = ('user__username__exact',)
+    list_filter = ('event_type', ProjectIdFilter)
+    autocomplete_fields = ('project', 'user')
     ordering = ('-created_at',)
 
 
 @admin.register(Notification)
-class NotificationAdmin(admin.ModelAdmin):
+class NotificationAdmin(LargeTableAdmin):
     list_display = ('user', 'message', 'is_read', 'created_at')
-    search_fields = ('message',)
-    list_filter = ('is_read', 'user')
-    ordering = ('-created_at',)
\ No newline at end of file
+    list_select_related = ('user',)
+    search_fields = ('user__username__exact',)
+    list_filter = ('is_read', UserIdFilter)
+    autocomplete_fields = ('user',)
+    ordering = ('-created_at',)
@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.core.signals import request_finished
 
 
 class ProjectAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'project_app'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
+        from .timeline import flush_timeline_buffer
+
+        # write buffered timeline events once the response has been sent
+        request_finished.connect(flush_timeline_buffer, dispatch_uid='flush_timeline_buffer')
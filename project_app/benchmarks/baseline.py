@@ -0,0 +1,44 @@
+import json
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save(path, results):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare(results, baseline, latency_tolerance=None, bytes_tolerance=0.1):
+    """
+    Return the regressions of ``results`` against ``baseline``. Every
+    baseline entry must be measured again. Status codes and row counts are
+    deterministic for a given scale and must not change, and query counts
+    must not grow; a failing endpoint returns fewer rows and bytes, so it is
+    caught here rather than passing as an improvement. Bytes may grow by
+    ``bytes_tolerance``. Timings depend on the machine, so they are only
+    compared when ``latency_tolerance`` is given.
+    """
+    regressions = []
+    for name, expected in sorted(baseline.items()):
+        current = results.get(name)
+        if current is None:
+            regressions.append(f"{name}: missing from the results")
+            continue
+        for metric in ('status', 'rows'):
+            if metric in expected and current.get(metric) != expected[metric]:
+                regressions.append(f"{name}: {metric} {current.get(metric)} != {expected[metric]}")
+        for metric in ('queries', 'errors'):
+            if metric in expected and current.get(metric, 0) > expected[metric]:
+                regressions.append(f"{name}: {metric} {current[metric]} > {expected[metric]}")
+        if 'bytes' in expected and current['bytes'] > expected['bytes'] * (1 + bytes_tolerance):
+            regressions.append(f"{name}: bytes {current['bytes']} > {expected['bytes']}")
+        if latency_tolerance is None:
+            continue
+        for metric in ('latency_ms', 'p95_ms'):
+            if metric in expected and current[metric] > expected[metric] * (1 + latency_tolerance):
+                regressions.append(f"{name}: {metric} {current[metric]} > {expected[metric]}")
+    return regressions
@@ -0,0 +1,103 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from ..membership import ProjectMember
+from ..models import Project, Task, Comment, Document, TimelineEvent, Notification
+
+
+SCALES = {
+    'small': {'users': 20, 'projects': 5, 'members': 10, 'tasks': 40, 'comments': 2, 'events': 20, 'documents': 5},
+    'medium': {'users': 200, 'projects': 50, 'members': 50, 'tasks': 200, 'comments': 3, 'events': 200,
+               'documents': 20},
+    'large': {'users': 2000, 'projects': 200, 'members': 1000, 'tasks': 1000, 'comments': 5, 'events': 1000,
+              'documents': 100},
+}
+
+BATCH_SIZE = 1000
+
+# generated rows are dated this far back so views that hide very recent
+# changes (/api/sync/ stays SYNC_LAG_SECONDS behind) still see them
+AGE = timedelta(hours=1)
+
+DOCUMENT_FILE = 'documents/bench.pdf'
+
+
+@transaction.atomic
+def generate(users, projects, members, tasks, comments, events, documents=0, seed=0):
+    """
+    Create a synthetic dataset with bulk inserts: ``projects`` projects with
+    ``members`` members, ``tasks`` tasks, ``documents`` documents and
+    ``events`` timeline events each, and ``comments`` comments per task.
+    The first user owns every project so it can see all of the data.
+    Returns that user.
+    """
+    rng = random.Random(seed)
+    password = make_password(None)
+    offset = User.objects.count()
+    user_objs = User.objects.bulk_create([
+        User(username=f'bench-{offset + i}', email=f'bench-{offset + i}@example.com', password=password)
+        for i in range(max(users, members, 1))
+    ], batch_size=BATCH_SIZE)
+    owner = user_objs[0]
+
+    project_objs = Project.objects.bulk_create([
+        Project(name=f'Project {i}', description='Synthetic project', created_by=owner,
+                status=rng.choice(Project.STATUS_CHOICES)[0])
+        for i in range(projects)
+    ], batch_size=BATCH_SIZE)
+
+    memberships, project_members = [], {}
+    for project in project_objs:
+        chosen = rng.sample(user_objs, members)
+        project_members[project.pk] = chosen
+        memberships.extend(ProjectMember(project_id=project.pk, user_id=user.pk) for user in chosen)
+    ProjectMember.objects.bulk_create(memberships, batch_size=BATCH_SIZE)
+
+    task_objs = Task.objects.bulk_create([
+        Task(title=f'Task {i}', description='Synthetic task ' * 5, project=project,
+             created_by=owner, assigned_to=rng.choice(project_members[project.pk] or [owner]),
+             status=rng.choice(Task.STATUS_CHOICES)[0], priority=rng.choice(Task.PRIORITY_CHOICES)[0])
+        for project in project_objs for i in range(tasks)
+    ], batch_size=BATCH_SIZE)
+
+    comment_objs = Comment.objects.bulk_create([
+        Comment(content=f'Comment {i}', author=rng.choice(project_members[task.project_id] or [owner]),
+                project_id=task.project_id, task=task)
+        for task in task_objs for i in range(comments)
+    ], batch_size=BATCH_SIZE)
+
+    if documents and not default_storage.exists(DOCUMENT_FILE):
+        # every document points at one stored file, which the serializer stats
+        default_storage.save(DOCUMENT_FILE, ContentFile(b'%PDF-1.4 synthetic' * 64))
+    document_objs = Document.objects.bulk_create([
+        Document(name=f'Document {i}.pdf', description='Synthetic document', project=project,
+                 uploaded_by=rng.choice(project_members[project.pk] or [owner]), file=DOCUMENT_FILE)
+        for project in project_objs for i in range(documents)
+    ], batch_size=BATCH_SIZE)
+
+    event_objs = TimelineEvent.objects.bulk_create([
+        TimelineEvent(project=project, event_type=rng.choice(TimelineEvent.EVENT_TYPES)[0],
+                      user=rng.choice(project_members[project.pk] or [owner]), description='Synthetic event')
+        for project in project_objs for _ in range(events)
+    ], batch_size=BATCH_SIZE)
+
+    notification_objs = Notification.objects.bulk_create([
+        Notification(user=user, title='Synthetic', message='Synthetic notification', is_read=rng.random() < 0.5)
+        for user in user_objs for _ in range(3)
+    ], batch_size=BATCH_SIZE)
+
+    past = timezone.now() - AGE
+    for model, objs in ((Project, project_objs), (Task, task_objs), (Document, document_objs),
+                        (Comment, comment_objs), (Notification, notification_objs)):
+        if objs:
+            model.objects.filter(pk__gte=objs[0].pk).update(created_at=past, updated_at=past)
+    if event_objs:
+        TimelineEvent.objects.filter(pk__gte=event_objs[0].pk).update(created_at=past)
+    return owner
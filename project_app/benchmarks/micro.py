@@ -0,0 +1,98 @@
+import statistics
+import time
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ..models import Project, Task, Comment, Document, TimelineEvent, Notification
+from ..renderers import FastJSONRenderer
+from ..serializers import (
+    ProjectSerializer, TaskSerializer, CommentSerializer, DocumentSerializer,
+    TimelineEventSerializer, NotificationSerializer
+)
+
+
+ENDPOINTS = [
+    '/api/projects/',
+    '/api/projects/?expand=members',
+    '/api/tasks/',
+    '/api/tasks/?fields=id,title,status',
+    '/api/documents/',
+    '/api/comments/',
+    '/api/timeline/',
+    '/api/notifications/',
+    '/api/sync/',
+]
+
+SERIALIZERS = [
+    (ProjectSerializer, Project),
+    (TaskSerializer, Task),
+    (DocumentSerializer, Document),
+    (CommentSerializer, Comment),
+    (TimelineEventSerializer, TimelineEvent),
+    (NotificationSerializer, Notification),
+]
+
+
+def auth_header(user):
+    return f'Bearer {RefreshToken.for_user(user).access_token}'
+
+
+def _rows(data):
+    if isinstance(data, dict):
+        if 'results' in data:
+            return len(data['results'])
+        if 'changes' in data:
+            return sum(len(rows) for rows in data['changes'].values())
+    return len(data) if isinstance(data, list) else 1
+
+
+def bench_endpoints(user, endpoints=ENDPOINTS, repeat=5):
+    """Latency (median ms), query count, rows and bytes per endpoint."""
+    client = Client(HTTP_AUTHORIZATION=auth_header(user))
+    results = {}
+    for path in endpoints:
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = client.get(path)
+                timings.append((time.perf_counter() - start) * 1000)
+        results[f'view {path}'] = {
+            'status': response.status_code,
+            'latency_ms': round(statistics.median(timings), 3),
+            'queries': len(queries),
+            'rows': _rows(response.json()) if response.status_code == 200 else 0,
+            'bytes': len(response.content),
+        }
+    return results
+
+
+def bench_serializers(user, limit=100, repeat=5):
+    """Load ``limit`` rows through each serializer's prepared queryset and render them."""
+    factory = APIRequestFactory()
+    renderer = FastJSONRenderer()
+    results = {}
+    for serializer_class, model in SERIALIZERS:
+        wsgi_request = factory.get('/')
+        force_authenticate(wsgi_request, user=user)
+        request = Request(wsgi_request)
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                queryset = serializer_class.prepare_queryset(model.objects.all(), request)[:limit]
+                data = serializer_class(queryset, many=True, context={'request': request}).data
+                body = renderer.render(data)
+                timings.append((time.perf_counter() - start) * 1000)
+        results[f'serializer {serializer_class.__name__}'] = {
+            'latency_ms': round(statistics.median(timings), 3),
+            'queries': len(queries),
+            'rows': len(data),
+            'bytes': len(body),
+        }
+    return results
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+
+# backends whose entries are only visible to the process that wrote them
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_is_process_local(alias='default'):
+    return settings.CACHES.get(alias, {}).get('BACKEND') in PROCESS_LOCAL_CACHES
+
+
+@register(Tags.caches)
+def check_replica_cache(app_configs, **kwargs):
+    """
+    Read-your-writes pins live in the cache, so with a per-process cache a
+    user's next request can land on another worker and read a stale replica.
+    """
+    if getattr(settings, 'DATABASE_REPLICAS', None) and cache_is_process_local():
+        return [Error(
+            "DATABASE_REPLICAS is set but the default cache is process-local.",
+            hint="Point CACHE_URL (CACHES['default']) at a shared cache such as Redis.",
+            id='project_app.E001',
+        )]
+    return []
+
+
+@register(Tags.caches)
+def check_task_graph_cache(app_configs, **kwargs):
+    """
+    A graph invalidated in one worker stays cached in the others, so their
+    dependency reads can be TASK_GRAPH_CACHE_SECONDS out of date.
+    """
+    if not settings.DEBUG and settings.TASK_GRAPH_CACHE_SECONDS and cache_is_process_local():
+        return [Warning(
+            "Task graphs are cached in a process-local cache.",
+            hint="Point CACHE_URL at a shared cache, or set TASK_GRAPH_CACHE_SECONDS = 0.",
+            id='project_app.W002',
+        )]
+    return []
@@ -0,0 +1,100 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+
+from .membership import ProjectMember
+from .models import Project, Task, TaskDependency, Document
+from .timeline import record_event
+
+
+TASK_FIELDS = ['id', 'title', 'description', 'status', 'priority', 'assigned_to_id', 'due_date']
+
+
+def _shift(value, days):
+    return value + timedelta(days=days) if value is not None and days else value
+
+
+@transaction.atomic
+def clone_project(source, user, name=None, shift_days=0, reset_status=True, members=True,
+                  documents=False, dependencies=True):
+    """
+    Copy ``source`` into a new project owned by ``user``: its members, its
+    tasks (dates moved by ``shift_days``, statuses optionally reset to
+    ``todo``), the dependencies between those tasks and, optionally, its
+    documents as references to the same stored files. Everything is read
+    with a few ``values`` queries and written with bulk inserts; one
+    summary timeline event is recorded. Returns the project and the counts
+    of copied rows.
+    """
+    batch_size = settings.PROJECT_CLONE_BATCH_SIZE
+    project = Project.objects.create(
+        name=name or f"Copy of {source.name}",
+        description=source.description,
+        status='active' if reset_status else source.status,
+        created_by=user,
+        start_date=_shift(source.start_date, shift_days),
+        end_date=_shift(source.end_date, shift_days),
+    )
+    copied = {'members': 0, 'tasks': 0, 'dependencies': 0, 'documents': 0}
+
+    member_ids = set()
+    if members:
+        member_ids = set(ProjectMember.objects.filter(project_id=source.pk).values_list('user_id', flat=True))
+        if source.created_by_id != user.pk:
+            # the original owner keeps access to the copy
+            member_ids.add(source.created_by_id)
+        member_ids.discard(user.pk)
+        ProjectMember.objects.bulk_create(
+            [ProjectMember(project_id=project.pk, user_id=user_id) for user_id in member_ids],
+            batch_size=batch_size
+        )
+        copied['members'] = len(member_ids)
+
+    assignable = member_ids | {user.pk}
+    rows = list(Task.objects.filter(project_id=source.pk).order_by('id').values(*TASK_FIELDS))
+    tasks = Task.objects.bulk_create([
+        Task(
+            project_id=project.pk,
+            created_by_id=user.pk,
+            title=row['title'],
+            description=row['description'],
+            status='todo' if reset_status else row['status'],
+            priority=row['priority'],
+            # assignees outside the copy would be unable to see their task
+            assigned_to_id=row['assigned_to_id'] if row['assigned_to_id'] in assignable else None,
+            due_date=_shift(row['due_date'], shift_days),
+        )
+        for row in rows
+    ], batch_size=batch_size)
+    copied['tasks'] = len(tasks)
+
+    if dependencies and tasks:
+        new_ids = {row['id']: task.pk for row, task in zip(rows, tasks)}
+        edges = TaskDependency.objects.filter(project_id=source.pk).values_list('blocker_id', 'blocked_id')
+        created = TaskDependency.objects.bulk_create([
+            TaskDependency(project_id=project.pk, blocker_id=new_ids[blocker], blocked_id=new_ids[blocked])
+            for blocker, blocked in edges
+            # skip edges left behind by a task that has moved to another project
+            if blocker in new_ids and blocked in new_ids
+        ], batch_size=batch_size)
+        copied['dependencies'] = len(created)
+
+    if documents:
+        created = Document.objects.bulk_create([
+            Document(project_id=project.pk, uploaded_by_id=user.pk, name=doc['name'],
+                     description=doc['description'], file=doc['file'])
+            for doc in Document.objects.filter(project_id=source.pk).values('name', 'description', 'file')
+        ], batch_size=batch_size)
+        copied['documents'] = len(created)
+
+    record_event(
+        project=project,
+        event_type='project_created',
+        user=user,
+        description=(
+            f"Project '{project.name}' cloned from '{source.name}' with {copied['tasks']} tasks, "
+            f"{copied['members']} members and {copied['documents']} documents."
+        )
+    )
+    return project, copied
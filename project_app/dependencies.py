@@ -0,0 +1,160 @@
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Project, Task, TaskDependency
+
+
+class DependencyError(Exception):
+    pass
+
+
+class TaskGraph:
+    """
+    Dependency graph of one project, built from two bulk queries. Edges run
+    from blocker to blocked task. Every query below is O(tasks + edges).
+    """
+
+    def __init__(self, tasks, edges):
+        # tasks: {id: {'id', 'title', 'status', 'due_date'}}
+        self.tasks = tasks
+        self.successors = {task_id: [] for task_id in tasks}
+        self.predecessors = {task_id: [] for task_id in tasks}
+        for blocker, blocked in edges:
+            if blocker not in tasks or blocked not in tasks:
+                # an edge left behind by a task that moved to another project
+                continue
+            self.successors[blocker].append(blocked)
+            self.predecessors[blocked].append(blocker)
+
+    def reaches(self, source, target):
+        seen, stack = {source}, [source]
+        while stack:
+            node = stack.pop()
+            if node == target:
+                return True
+            for successor in self.successors.get(node, ()):
+                if successor not in seen:
+                    seen.add(successor)
+                    stack.append(successor)
+        return False
+
+    def blocked(self):
+        """Tasks with at least one blocker that is not done, with those blockers."""
+        result = []
+        for task_id, blockers in self.predecessors.items():
+            open_blockers = [b for b in blockers if self.tasks[b]['status'] != 'done']
+            if open_blockers and self.tasks[task_id]['status'] != 'done':
+                result.append((task_id, open_blockers))
+        return result
+
+    def topological_order(self):
+        """Kahn's algorithm; ties are broken by due date, then id."""
+        remaining = {task_id: len(blockers) for task_id, blockers in self.predecessors.items()}
+        ready = deque(sorted((t for t, n in remaining.items() if n == 0), key=self._sort_key))
+        order = []
+        while ready:
+            node = ready.popleft()
+            order.append(node)
+            unlocked = []
+            for successor in self.successors[node]:
+                remaining[successor] -= 1
+                if remaining[successor] == 0:
+                    unlocked.append(successor)
+            ready.extend(sorted(unlocked, key=self._sort_key))
+        if len(order) != len(self.tasks):
+            raise DependencyError("Task dependencies contain a cycle.")
+        return order
+
+    def critical_path(self):
+        """
+        The dependency chain spanning the most calendar time. A task adds the
+        days between its due date and the due date of the previous task on
+        the chain; chains without dates fall back to the number of tasks.
+        Returns the task ids along the path and the span in days.
+        """
+        best = {}
+        previous = {}
+        for node in self.topological_order():
+            due = self.tasks[node]['due_date']
+            score, parent = (0, 1), None
+            for blocker in self.predecessors[node]:
+                days, length = best[blocker]
+                blocker_due = self.tasks[blocker]['due_date']
+                gap = (due - blocker_due).days if due and blocker_due and due > blocker_due else 0
+                candidate = (days + gap, length + 1)
+                if candidate > score:
+                    score, parent = candidate, blocker
+            best[node], previous[node] = score, parent
+
+        if not best:
+            return [], 0
+        node = max(best, key=lambda task_id: best[task_id])
+        span = best[node][0]
+        path = []
+        while node is not None:
+            path.append(node)
+            node = previous[node]
+        return path[::-1], span
+
+    def _sort_key(self, task_id):
+        due = self.tasks[task_id]['due_date']
+        return (due is None, due or 0, task_id)
+
+
+def load_graph(project_id):
+    tasks = {
+        row['id']: row
+        for row in Task.objects.filter(project_id=project_id).values('id', 'title', 'status', 'due_date')
+    }
+    edges = TaskDependency.objects.filter(project_id=project_id).values_list('blocker_id', 'blocked_id')
+    return TaskGraph(tasks, list(edges))
+
+
+def _version_key(project_id):
+    return f'task-graph-version:{project_id}'
+
+
+def get_graph(project_id):
+    """Cached graph of a project; any task or dependency change bumps its version."""
+    version = cache.get_or_set(_version_key(project_id), 1, timeout=None)
+    key = f'task-graph:{project_id}:{version}'
+    graph = cache.get(key)
+    if graph is None:
+        graph = load_graph(project_id)
+        cache.set(key, graph, timeout=settings.TASK_GRAPH_CACHE_SECONDS)
+    return graph
+
+
+def invalidate_graph(project_id):
+    try:
+        cache.incr(_version_key(project_id))
+    except ValueError:
+        # no version stored yet, so nothing cached to invalidate
+        pass
+
+
+def add_dependency(blocker, blocked):
+    """
+    Insert ``blocker -> blocked`` unless it exists or closes a cycle. The
+    check runs on a graph loaded from the database under the project's row
+    lock, never on the cached one, which another worker may not have
+    invalidated yet.
+    """
+    if blocker.pk == blocked.pk:
+        raise DependencyError("A task cannot block itself.")
+    if blocker.project_id != blocked.project_id:
+        raise DependencyError("Both tasks must belong to the same project.")
+
+    with transaction.atomic():
+        # serialise dependency changes per project so two inserts cannot
+        # close a cycle together
+        Project.objects.select_for_update().filter(pk=blocked.project_id).first()
+        graph = load_graph(blocked.project_id)
+        if blocker.pk in graph.predecessors.get(blocked.pk, ()):
+            raise DependencyError("Dependency already exists.")
+        if graph.reaches(blocked.pk, blocker.pk):
+            raise DependencyError("Dependency would create a cycle.")
+        return TaskDependency.objects.create(project_id=blocked.project_id, blocker=blocker, blocked=blocked)
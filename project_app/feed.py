@@ -0,0 +1,184 @@
+import logging
+from datetime import datetime
+
+from django.conf import settings
+from django.core import signing
+from django.db import models, transaction
+
+from .membership import ProjectMember
+from .models import FeedEntry, PrecomputedFeed, Project, TimelineEvent
+from .serializers import TimelineEventSerializer
+from .sync import accessible_project_ids
+
+
+logger = logging.getLogger(__name__)
+
+CURSOR_SALT = 'project_app.feed'
+
+
+class InvalidFeedCursor(Exception):
+    pass
+
+
+def encode_cursor(created_at, pk):
+    return signing.dumps([created_at.isoformat(), pk], salt=CURSOR_SALT)
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, pk = signing.loads(cursor, salt=CURSOR_SALT)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (signing.BadSignature, TypeError, ValueError):
+        raise InvalidFeedCursor("Invalid feed cursor.")
+
+
+def _before(after, field, pk_field):
+    """Rows strictly older than the (created_at, pk) cursor in feed order."""
+    created_at, pk = after
+    return models.Q(**{f'{field}__lt': created_at}) | models.Q(**{field: created_at, f'{pk_field}__lt': pk})
+
+
+def recent_events(project_ids, after=None):
+    queryset = TimelineEvent.objects.filter(project_id__in=project_ids)
+    if after is not None:
+        queryset = queryset.filter(_before(after, 'created_at', 'pk'))
+    return queryset.order_by('-created_at', '-pk')
+
+
+def _entries(user_id, events):
+    return [
+        FeedEntry(user_id=user_id, event_id=event.pk, project_id=event.project_id, created_at=event.created_at)
+        for event in events
+    ]
+
+
+def backfill(user_id, project_ids):
+    """
+    Copy the latest FEED_PRECOMPUTE_BACKFILL events of ``project_ids`` into
+    the user's feed. Returns the time of the oldest one when older events
+    were left out, else None.
+    """
+    limit = settings.FEED_PRECOMPUTE_BACKFILL
+    events = list(recent_events(project_ids).only('pk', 'project_id', 'created_at')[:limit])
+    FeedEntry.objects.bulk_create(_entries(user_id, events), ignore_conflicts=True)
+    return events[-1].created_at if len(events) == limit else None
+
+
+def mark_incomplete(before):
+    """Fall back to the timeline for events up to ``before`` in every precomputed feed."""
+    PrecomputedFeed.objects.filter(
+        models.Q(complete_after__isnull=True) | models.Q(complete_after__lt=before)
+    ).update(complete_after=before)
+
+
+def fan_out(events):
+    """Copy new timeline events into the precomputed feeds of everyone who can see them."""
+    events = [event for event in events if event.pk is not None]
+    if not events or settings.FEED_PRECOMPUTE_MIN_PROJECTS is None:
+        return
+    project_ids = {event.project_id for event in events}
+    precomputed = PrecomputedFeed.objects.values('user_id')
+    members = ProjectMember.objects.filter(
+        project_id__in=project_ids, user_id__in=precomputed
+    ).values_list('project_id', 'user_id')
+    owners = Project.objects.filter(
+        pk__in=project_ids, created_by_id__in=precomputed
+    ).order_by().values_list('pk', 'created_by_id')
+    recipients = {}
+    for project_id, user_id in members.union(owners):
+        recipients.setdefault(project_id, set()).add(user_id)
+    if not recipients:
+        return
+    FeedEntry.objects.bulk_create([
+        entry
+        for event in events
+        for user_id in recipients.get(event.project_id, ())
+        for entry in _entries(user_id, [event])
+    ], ignore_conflicts=True)
+
+
+def fan_out_safely(events):
+    try:
+        with transaction.atomic():
+            fan_out(events)
+    except Exception:
+        # the events are saved; the precomputed feeds stop short of them
+        # and read them from the timeline instead
+        logger.exception("Feed fan-out failed for %d timeline events", len(events))
+        saved = [event.created_at for event in events if event.pk is not None]
+        if saved:
+            try:
+                mark_incomplete(max(saved))
+            except Exception:
+                logger.exception("Could not mark precomputed feeds incomplete")
+
+
+def precomputed_feed(user, accessible):
+    """
+    The user's precomputed feed, created once they can see
+    FEED_PRECOMPUTE_MIN_PROJECTS projects, with its entries brought in line
+    with the projects they can currently see.
+    """
+    threshold = settings.FEED_PRECOMPUTE_MIN_PROJECTS
+    if threshold is None:
+        return None
+    state = PrecomputedFeed.objects.filter(user=user).first()
+    if state is None:
+        if len(accessible) < threshold:
+            return None
+        # register first so events written during the backfill are fanned out
+        state, _ = PrecomputedFeed.objects.get_or_create(user=user)
+
+    known = set(state.project_ids)
+    if known != accessible:
+        removed, added = known - accessible, accessible - known
+        if removed:
+            FeedEntry.objects.filter(user=user, project_id__in=removed).delete()
+        if added:
+            horizon = backfill(user.pk, added)
+            if horizon is not None and (state.complete_after is None or horizon > state.complete_after):
+                state.complete_after = horizon
+        state.project_ids = sorted(accessible)
+        state.save(update_fields=['project_ids', 'complete_after'])
+    return state
+
+
+def build_feed(request, cursor=None, limit=None):
+    """
+    Timeline events of every project the user can see, newest first, as
+    one keyset page. Users with a precomputed feed read it from their own
+    entries down to its ``complete_after`` horizon; past that, or for
+    everyone else, the page comes from a single query over the timeline.
+    """
+    user = request.user
+    limit = limit or settings.FEED_PAGE_SIZE
+    after = decode_cursor(cursor) if cursor else None
+    accessible = accessible_project_ids(user)
+
+    state = precomputed_feed(user, accessible)
+    if state is not None:
+        entries = FeedEntry.objects.filter(user=user)
+        if state.complete_after is not None:
+            entries = entries.filter(created_at__gt=state.complete_after)
+        if after is not None:
+            entries = entries.filter(_before(after, 'created_at', 'event_id'))
+        rows = list(entries.order_by('-created_at', '-event_id').values_list('event_id', 'created_at')[:limit + 1])
+        # a short page means the entries ran out at the horizon
+        if len(rows) > limit:
+            ids = [event_id for event_id, _ in rows[:limit]]
+            queryset = TimelineEventSerializer.prepare_queryset(TimelineEvent.objects.filter(pk__in=ids), request)
+            events = sorted(queryset, key=lambda event: (event.created_at, event.pk), reverse=True)
+            event_id, created_at = rows[limit - 1]
+            return {
+                'next': encode_cursor(created_at, event_id),
+                'results': TimelineEventSerializer(events, many=True, context={'request': request}).data,
+            }
+
+    queryset = TimelineEventSerializer.prepare_queryset(recent_events(accessible, after), request)
+    events = list(queryset[:limit + 1])
+    has_more = len(events) > limit
+    events = events[:limit]
+    return {
+        'next': encode_cursor(events[-1].created_at, events[-1].pk) if has_more else None,
+        'results': TimelineEventSerializer(events, many=True, context={'request': request}).data,
+    }
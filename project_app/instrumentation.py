@@ -0,0 +1,144 @@
+import threading
+import time
+from contextvars import ContextVar
+
+
+_current = ContextVar('request_metrics', default=None)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class RequestMetrics:
+    """Counters collected for one request."""
+
+    def __init__(self, capture_sql=False):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.capture_sql = capture_sql
+        self.statements = []
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def begin(capture_sql=False):
+    return _current.set(RequestMetrics(capture_sql=capture_sql))
+
+
+def end(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+def record_query(execute, sql, params, many, context):
+    """``connection.execute_wrapper`` hook that times every query."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        metrics.queries += 1
+        metrics.db_time += duration
+        if metrics.capture_sql:
+            metrics.statements.append((duration, sql))
+
+
+class serialization_timer:
+    """Add the time spent in the block to the request's serialization time."""
+
+    __slots__ = ('metrics', 'start')
+
+    def __enter__(self):
+        self.metrics = _current.get()
+        if self.metrics is not None:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.metrics is not None:
+            self.metrics.serialize_time += time.perf_counter() - self.start
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Per-process, per-route aggregates exposed in Prometheus text format."""
+
+    metrics = (
+        ('api_request_duration_seconds', 'Request duration in seconds.', DURATION_BUCKETS),
+        ('api_request_db_seconds', 'Time spent in SQL per request in seconds.', DURATION_BUCKETS),
+        ('api_request_serialize_seconds', 'Time spent serializing and rendering per request in seconds.',
+         DURATION_BUCKETS),
+        ('api_request_queries', 'SQL queries per request.', QUERY_BUCKETS),
+        ('api_response_size_bytes', 'Response body size in bytes.', SIZE_BUCKETS),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, method, route, status, metrics, size):
+        key = (method, route, str(status)[0] + 'xx')
+        values = (metrics.elapsed(), metrics.db_time, metrics.serialize_time, metrics.queries, size)
+        with self._lock:
+            histograms = self._series.get(key)
+            if histograms is None:
+                histograms = self._series[key] = [Histogram(buckets) for _, _, buckets in self.metrics]
+            for histogram, value in zip(histograms, values):
+                histogram.observe(value)
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        with self._lock:
+            series = {key: [(list(h.counts), h.sum, h.count) for h in histograms]
+                      for key, histograms in self._series.items()}
+
+        lines = []
+        for index, (name, help_text, buckets) in enumerate(self.metrics):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for (method, route, status), values in sorted(series.items()):
+                counts, total, count = values[index]
+                labels = f'method="{method}",route="{_escape(route)}",status="{status}"'
+                cumulative = 0
+                for bound, bucket_count in zip(buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {count}')
+                lines.append(f'{name}_sum{{{labels}}} {total}')
+                lines.append(f'{name}_count{{{labels}}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = Registry()
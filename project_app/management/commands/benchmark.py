@@ -0,0 +1,89 @@
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from project_app.benchmarks import baseline, data, load, micro
+
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(data.__file__), 'baseline.json')
+
+LOAD_ENDPOINTS = ['/api/projects/', '/api/tasks/', '/api/timeline/', '/api/notifications/']
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the API benchmarks against a throwaway test database filled with "
+        "synthetic data and optionally compare them to a stored baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(data.SCALES), default='small')
+        for name in ('users', 'projects', 'members', 'tasks', 'comments', 'events', 'documents'):
+            parser.add_argument(f'--{name}', type=int, default=None, help=f"Override the scale's {name}.")
+        parser.add_argument('--repeat', type=int, default=5, help="Runs per micro-benchmark.")
+        parser.add_argument('--skip-load', action='store_true', help="Only run the micro-benchmarks.")
+        parser.add_argument('--interface', choices=['wsgi', 'asgi'], default='wsgi')
+        parser.add_argument('--requests', type=int, default=200, help="Requests per load-tested endpoint.")
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+        parser.add_argument('--compare', action='store_true',
+                            help="Fail when results regress against the baseline.")
+        parser.add_argument('--latency-tolerance', type=float, default=None,
+                            help="Also fail when timings exceed the baseline by this fraction.")
+        parser.add_argument('--save-baseline', action='store_true', help="Write the results as the new baseline.")
+
+    def handle(self, *args, **options):
+        scale = dict(data.SCALES[options['scale']])
+        for name in scale:
+            if options[name] is not None:
+                scale[name] = options[name]
+
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            # synthetic document files go to a throwaway media root as well
+            with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+                results = self.run(scale, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        for name, metrics in sorted(results.items()):
+            values = ' '.join(f'{key}={value}' for key, value in sorted(metrics.items()))
+            self.stdout.write(f'{name:<48} {values}')
+
+        if options['save_baseline']:
+            baseline.save(options['baseline'], results)
+            self.stdout.write(f"Baseline written to {options['baseline']}")
+        if options['compare']:
+            expected = baseline.load(options['baseline'])
+            # load entries only count when this run load-tested the same interface
+            measured = f"load {options['interface']} "
+            expected = {
+                name: metrics for name, metrics in expected.items()
+                if not name.startswith('load ') or (not options['skip_load'] and name.startswith(measured))
+            }
+            regressions = baseline.compare(results, expected, latency_tolerance=options['latency_tolerance'])
+            if regressions:
+                raise CommandError("Benchmark regressions:\n" + '\n'.join(regressions))
+            self.stdout.write("No regressions against the baseline.")
+
+    def run(self, scale, options):
+        owner = data.generate(**scale)
+        results = {}
+        results.update(micro.bench_endpoints(owner, repeat=options['repeat']))
+        results.update(micro.bench_serializers(owner, repeat=options['repeat']))
+        if options['skip_load']:
+            return results
+
+        driver = load.run_asgi if options['interface'] == 'asgi' else load.run_wsgi
+        authorization = micro.auth_header(owner)
+        for path in LOAD_ENDPOINTS:
+            results[f"load {options['interface']} {path}"] = driver(
+                path, authorization, requests=options['requests'], concurrency=options['concurrency']
+            )
+        return results
@@ -0,0 +1,76 @@
+import gzip
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import resolve
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from project_app import renderers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+DEFAULT_ENDPOINTS = [
+    '/api/projects/',
+    '/api/tasks/',
+    '/api/documents/',
+    '/api/comments/',
+    '/api/timeline/',
+    '/api/notifications/',
+]
+
+
+def _timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return result, (time.perf_counter() - start) / repeat * 1000
+
+
+class Command(BaseCommand):
+    help = "Measure response bytes and encode time per endpoint for each renderer and compression."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True, help="Username to request the endpoints as.")
+        parser.add_argument('--repeat', type=int, default=50, help="Encodes per measurement.")
+        parser.add_argument('endpoints', nargs='*', default=DEFAULT_ENDPOINTS)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['user']}' does not exist.")
+
+        encoders = [('json', JSONRenderer()), ('fast-json', renderers.FastJSONRenderer())]
+        if renderers.msgpack is not None:
+            encoders.append(('msgpack', renderers.MessagePackRenderer()))
+        compressors = [('gzip', lambda body: gzip.compress(body, compresslevel=6))]
+        if brotli is not None:
+            compressors.append(('br', lambda body: brotli.compress(body, quality=5)))
+
+        factory = APIRequestFactory()
+        repeat = options['repeat']
+        self.stdout.write(f"{'endpoint':<24} {'encoding':<16} {'bytes':>10} {'ms':>9}")
+
+        for path in options['endpoints']:
+            match = resolve(path.split('?')[0])
+            request = factory.get(path, HTTP_HOST='localhost')
+            force_authenticate(request, user=user)
+            response = match.func(request, *match.args, **match.kwargs)
+            if response.status_code != 200:
+                self.stderr.write(f"{path}: HTTP {response.status_code}, skipped")
+                continue
+
+            for name, renderer in encoders:
+                body, elapsed = _timed(lambda: renderer.render(response.data), repeat)
+                self.stdout.write(f"{path:<24} {name:<16} {len(body):>10} {elapsed:>9.3f}")
+                if name != 'fast-json':
+                    continue
+                for encoding, compress in compressors:
+                    compressed, elapsed = _timed(lambda: compress(body), repeat)
+                    self.stdout.write(f"{path:<24} {name + '+' + encoding:<16} {len(compressed):>10} {elapsed:>9.3f}")
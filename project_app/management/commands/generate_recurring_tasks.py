@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from project_app.recurrence import materialize
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the tasks of active recurring task templates up to the "
+        "horizon, catching up windows missed since the last run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horizon-days', type=int, default=None,
+                            help="Days ahead to generate (defaults to RECURRING_TASK_HORIZON_DAYS).")
+        parser.add_argument('--catchup-days', type=int, default=None,
+                            help="Oldest missed window to catch up (defaults to RECURRING_TASK_CATCHUP_DAYS).")
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        results = materialize(
+            horizon_days=options['horizon_days'],
+            catchup_days=options['catchup_days'],
+            batch_size=options['batch_size']
+        )
+        self.stdout.write(f"templates: {len(results)}")
+        self.stdout.write(f"tasks: {sum(results.values())}")
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from project_app import retention
+from project_app.models import Notification, TimelineEvent
+
+
+class Command(BaseCommand):
+    help = (
+        "Archive old timeline events and notifications, delete old read "
+        "notifications and maintain Postgres partitions for both tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--archive-format', choices=['ndjson', 'table'], default='ndjson',
+                            help="Write archived rows to gzipped NDJSON files or to the cold tables.")
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Rows per transaction (defaults to RETENTION_BATCH_SIZE).")
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--ensure-partitions', type=int, metavar='MONTHS', default=None,
+                            help="Create monthly partitions this many months ahead (Postgres only).")
+        parser.add_argument('--partition-sql', action='store_true',
+                            help="Print the SQL that converts both tables to partitioned tables and exit.")
+
+    def handle(self, *args, **options):
+        using = options['database']
+        partitioned_models = [TimelineEvent, Notification]
+
+        if options['partition_sql'] or options['ensure_partitions'] is not None:
+            if connections[using].vendor != 'postgresql':
+                raise CommandError("Partitioning is only supported on PostgreSQL.")
+
+        if options['partition_sql']:
+            for model in partitioned_models:
+                for statement in retention.partition_table_sql(model, using=using):
+                    self.stdout.write(statement.rstrip(';') + ';')
+            return
+
+        if options['ensure_partitions'] is not None:
+            for model in partitioned_models:
+                created = retention.ensure_partitions(model, options['ensure_partitions'], using=using)
+                self.stdout.write(f"{model._meta.db_table}: {len(created)} partitions ensured.")
+
+        results = retention.run_retention(
+            archive_format=options['archive_format'],
+            batch_size=options['batch_size'],
+            using=using
+        )
+        for key, count in results.items():
+            self.stdout.write(f"{key}: {count}")
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from project_app.reminders import send_digests
+
+
+class Command(BaseCommand):
+    help = (
+        "Send each assignee one digest notification with their tasks that "
+        "became due soon or overdue since their last digest."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--soon-days', type=int, default=None,
+                            help="Days ahead that count as due soon (defaults to REMINDER_DUE_SOON_DAYS).")
+        parser.add_argument('--overdue-days', type=int, default=None,
+                            help="Days past the due date to keep reminding (defaults to REMINDER_OVERDUE_DAYS).")
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        sent = send_digests(
+            soon_days=options['soon_days'],
+            overdue_days=options['overdue_days'],
+            batch_size=options['batch_size']
+        )
+        self.stdout.write(f"digests: {sent}")
@@ -0,0 +1,105 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Notification, Project
+
+
+ProjectMember = Project.members.through
+
+BATCH_SIZE = 1000
+
+
+def _chunks(values, size=BATCH_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def missing_user_ids(user_ids):
+    """Return the ids in ``user_ids`` that do not belong to a user."""
+    user_ids = set(user_ids)
+    found = set(User.objects.filter(id__in=user_ids).values_list('id', flat=True))
+    return sorted(user_ids - found)
+
+
+def current_member_ids(project):
+    return set(ProjectMember.objects.filter(project_id=project.pk).values_list('user_id', flat=True))
+
+
+def _insert(project, user_ids):
+    ProjectMember.objects.bulk_create(
+        [ProjectMember(project_id=project.pk, user_id=user_id) for user_id in user_ids],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def _delete(project, user_ids):
+    for chunk in _chunks(user_ids):
+        ProjectMember.objects.filter(project_id=project.pk, user_id__in=chunk).delete()
+
+
+def _touch(project, added, removed):
+    # membership lives in the through table, so bump the project for sync clients
+    if added or removed:
+        project.updated_at = timezone.now()
+        Project.objects.filter(pk=project.pk).update(updated_at=project.updated_at)
+
+
+def add_members(project, user_ids):
+    user_ids = set(user_ids)
+    with transaction.atomic():
+        existing = set()
+        for chunk in _chunks(user_ids):
+            existing.update(
+                ProjectMember.objects.filter(project_id=project.pk, user_id__in=chunk)
+                .values_list('user_id', flat=True)
+            )
+        added = user_ids - existing
+        _insert(project, added)
+        _touch(project, added, set())
+        notify_membership_change(project, added, set())
+    return added, set()
+
+
+def remove_members(project, user_ids):
+    user_ids = set(user_ids)
+    with transaction.atomic():
+        removed = user_ids & current_member_ids(project)
+        _delete(project, removed)
+        _touch(project, set(), removed)
+        notify_membership_change(project, set(), removed)
+    return set(), removed
+
+
+def replace_members(project, user_ids, notify=True):
+    user_ids = set(user_ids)
+    with transaction.atomic():
+        current = current_member_ids(project)
+        added, removed = user_ids - current, current - user_ids
+        _delete(project, removed)
+        _insert(project, added)
+        _touch(project, added, removed)
+        if notify:
+            notify_membership_change(project, added, removed)
+    return added, removed
+
+
+def notify_membership_change(project, added, removed):
+    notifications = [
+        Notification(
+            user_id=user_id,
+            title=f"Added to project: {project.name}",
+            message=f"You have been added to project {project.name}.",
+        )
+        for user_id in added
+    ] + [
+        Notification(
+            user_id=user_id,
+            title=f"Removed from project: {project.name}",
+            message=f"You have been removed from project {project.name}.",
+        )
+        for user_id in removed
+    ]
+    Notification.objects.bulk_create(notifications, batch_size=BATCH_SIZE)
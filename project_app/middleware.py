@@ -0,0 +1,182 @@
+import json
+import logging
+import random
+import re
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from rest_framework.permissions import SAFE_METHODS
+
+from . import instrumentation, routers
+from .permissions import has_metrics_access
+from .timeline import timeline_buffer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+request_logger = logging.getLogger('project_app.requests')
+slow_request_logger = logging.getLogger('project_app.slow_requests')
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Scope ReplicaRouter decisions to a single request. Unsafe methods read
+    from the primary for the whole request, and a request that wrote pins its
+    user to the primary for DATABASE_REPLICA_STICKY_SECONDS afterwards.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = routers.begin_request(request, pinned=request.method not in SAFE_METHODS)
+        try:
+            response = self.get_response(request)
+            state = routers.current_state()
+            user = getattr(request, 'user', None)
+            if state.wrote and user is not None and user.is_authenticated:
+                cache.set(
+                    routers.sticky_cache_key(user.pk),
+                    True,
+                    timeout=getattr(settings, 'DATABASE_REPLICA_STICKY_SECONDS', 5)
+                )
+        finally:
+            routers.end_request(token)
+        return response
+
+
+class TimelineBufferMiddleware:
+    """
+    With TIMELINE_BUFFER_DURABLE, flush buffered timeline events before the
+    response is returned so a failed write surfaces as an error instead of
+    being lost after the client saw a success.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if getattr(settings, 'TIMELINE_BUFFER_DURABLE', False):
+            timeline_buffer.flush(raise_on_failure=True)
+        return response
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Django's GZipMiddleware, random-length padding against BREACH included,
+    plus brotli for clients that accept it. Brotli has no header to carry
+    that padding, so it is only used for requests without cookies: a
+    cross-site page can make a browser send cookies but not the
+    Authorization header. Bodies under RESPONSE_COMPRESSION_MIN_SIZE are
+    sent as they are since compressing them costs more CPU than it saves.
+    """
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding'):
+            return response
+        if not response.streaming and len(response.content) < getattr(settings, 'RESPONSE_COMPRESSION_MIN_SIZE', 1024):
+            return response
+
+        accepted = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if brotli is not None and not response.streaming and not request.COOKIES and _accepts(accepted, 'br'):
+            return self.compress_brotli(response)
+        if not _accepts(accepted, 'gzip'):
+            # Django's check does not honour q=0
+            patch_vary_headers(response, ('Accept-Encoding',))
+            return response
+        return super().process_response(request, response)
+
+    def compress_brotli(self, response):
+        patch_vary_headers(response, ('Accept-Encoding',))
+        content = brotli.compress(response.content, quality=getattr(settings, 'RESPONSE_COMPRESSION_BROTLI_QUALITY', 5))
+        if len(content) >= len(response.content):
+            return response
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        response['Content-Encoding'] = 'br'
+        if response.has_header('ETag'):
+            response['ETag'] = re.sub(r'^(W/)?"', 'W/"', response['ETag'])
+        return response
+
+
+def _accepts(header, encoding):
+    for item in header.split(','):
+        name, _, params = item.strip().partition(';')
+        if name.strip().lower() != encoding:
+            continue
+        return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+class InstrumentationMiddleware:
+    """
+    Record the query count, SQL time, serialization time and response size
+    of every request. These metrics are logged as one JSON line on
+    ``project_app.requests`` and aggregated per route for /api/_metrics.
+    The total time is sent back in a Server-Timing header, with the
+    database and serialization breakdown only for the callers allowed to
+    read /api/_metrics. A SLOW_REQUEST_SAMPLE_RATE share of requests also
+    keeps its SQL, which is logged on ``project_app.slow_requests`` when
+    the request takes longer than SLOW_REQUEST_MS.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'REQUEST_METRICS_ENABLED', True):
+            return self.get_response(request)
+
+        rate = getattr(settings, 'SLOW_REQUEST_SAMPLE_RATE', 0.0)
+        token = instrumentation.begin(capture_sql=rate > 0 and random.random() < rate)
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(instrumentation.record_query))
+                response = self.get_response(request)
+            self.report(request, response, instrumentation.current())
+        finally:
+            instrumentation.end(token)
+        return response
+
+    def report(self, request, response, metrics):
+        total = metrics.elapsed()
+        size = 0 if response.streaming else len(response.content)
+        match = request.resolver_match
+        route = match.route if match is not None else 'unmatched'
+
+        timing = f'total;dur={total * 1000:.3f}'
+        if has_metrics_access(request):
+            # the query breakdown is only for those who may read /api/_metrics
+            timing = (
+                f'db;dur={metrics.db_time * 1000:.3f};desc="{metrics.queries} queries", '
+                f'serialize;dur={metrics.serialize_time * 1000:.3f}, {timing}'
+            )
+        response['Server-Timing'] = timing
+        instrumentation.registry.observe(request.method, route, response.status_code, metrics, size)
+
+        record = {
+            'method': request.method,
+            'route': route,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': metrics.queries,
+            'db_ms': round(metrics.db_time * 1000, 3),
+            'serialize_ms': round(metrics.serialize_time * 1000, 3),
+            'total_ms': round(total * 1000, 3),
+            'bytes': size,
+        }
+        request_logger.info(json.dumps(record))
+
+        if metrics.capture_sql and total * 1000 >= getattr(settings, 'SLOW_REQUEST_MS', 500):
+            slowest = sorted(metrics.statements, reverse=True)[:getattr(settings, 'SLOW_REQUEST_MAX_QUERIES', 20)]
+            record['sql'] = [{'ms': round(duration * 1000, 3), 'sql': sql} for duration, sql in slowest]
+            slow_request_logger.warning(json.dumps(record))
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.1 on 2026-10-18 22:24
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project_app', '0005_task_dependency'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='recurrence_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True),
+        ),
+        migrations.CreateModel(
+            name='RecurringTaskTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=255)),
+                ('description', models.TextField(blank=True, null=True)),
+                ('priority', models.CharField(choices=[('low', 'Low'), ('medium', 'Medium'), ('high', 'High')], default='medium', max_length=20)),
+                ('schedule', models.CharField(max_length=255)),
+                ('due_offset_days', models.PositiveIntegerField(default=0)),
+                ('starts_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('generated_until', models.DateTimeField(blank=True, editable=False, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('assigned_to', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_task_templates', to=settings.AUTH_USER_MODEL)),
+                ('projects', models.ManyToManyField(related_name='recurring_task_templates', to='project_app.project')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
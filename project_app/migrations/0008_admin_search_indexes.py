@@ -0,0 +1,41 @@
+from django.db import migrations
+
+
+# Admin search uses istartswith, i.e. UPPER(column) LIKE 'TERM%'. On Postgres
+# that can only use an expression index with text_pattern_ops; other
+# backends get no index.
+SEARCH_INDEXES = [
+    ('project_name_search_idx', 'project_app_project', 'name'),
+    ('task_title_search_idx', 'project_app_task', 'title'),
+    ('document_name_search_idx', 'project_app_document', 'name'),
+    ('recurringtask_title_search_idx', 'project_app_recurringtasktemplate', 'title'),
+]
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in SEARCH_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON "{table}" (UPPER("{column}") text_pattern_ops)'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('project_app', '0007_reminders'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
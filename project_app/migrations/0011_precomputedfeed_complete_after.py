@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 22:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project_app', '0010_task_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='precomputedfeed',
+            name='complete_after',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
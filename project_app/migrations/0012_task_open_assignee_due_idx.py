@@ -0,0 +1,19 @@
+# Generated by Django 5.1.1 on 2026-10-18 23:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project_app', '0011_precomputedfeed_complete_after'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('assigned_to__isnull', False), models.Q(('status', 'done'), _negated=True)), fields=['assigned_to', 'due_date'], name='task_open_assignee_due_idx'),
+        ),
+    ]
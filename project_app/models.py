@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 # Create your models here.
@@ -22,10 +22,20 @@ class Project(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='project_updated_idx'),
+        ]
 
     def __str__(self):
         return self.name
-    
+
+    def delete(self, *args, **kwargs):
+        # sync clients drop everything of a project they lost, so the
+        # cascaded rows need no tombstones of their own
+        with transaction.atomic():
+            Tombstone.bury('projects', [(self.pk, self.pk)])
+            return super().delete(*args, **kwargs)
+
 
 class Task(models.Model):
     STATUS_CHOICES = [
@@ -48,16 +58,90 @@ class Task(models.Model):
     assigned_to = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='assigned_tasks')
     due_date = models.DateField(blank=True, null=True)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_tasks')
+    # bumped by save() and by the conditional updates in transitions.py, which
+    # compare it to detect conflicts; other queryset updates must bump it too
+    version = models.PositiveIntegerField(default=1)
+    # set on tasks generated from a RecurringTaskTemplate, one per occurrence
+    recurrence_key = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['project', 'updated_at', 'id'], name='task_project_updated_idx'),
+            # open, assigned tasks by due date for the reminder engine
+            models.Index(fields=['due_date', 'assigned_to'], name='task_open_due_idx',
+                         condition=models.Q(assigned_to__isnull=False) & ~models.Q(status='done')),
+            # the same tasks per assignee, so a batch of users is one seek each
+            models.Index(fields=['assigned_to', 'due_date'], name='task_open_assignee_due_idx',
+                         condition=models.Q(assigned_to__isnull=False) & ~models.Q(status='done')),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.project.name}"
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        # bump in the database, so concurrent saves cannot hand out the same version
+        self.version = models.F('version') + 1
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        super().save(*args, **kwargs)
+        self.refresh_from_db(fields=['version'])
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            comment_ids = self.comments.values_list('pk', flat=True)
+            Tombstone.bury('comments', [(pk, self.project_id) for pk in comment_ids])
+            Tombstone.bury('tasks', [(self.pk, self.project_id)])
+            return super().delete(*args, **kwargs)
     
 
+class TaskDependency(models.Model):
+    """``blocker`` has to be done before ``blocked`` can start."""
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='task_dependencies')
+    blocker = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='blocking')
+    blocked = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='blocked_by')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['blocker', 'blocked'], name='unique_task_dependency'),
+        ]
+
+    def __str__(self):
+        return f"{self.blocker_id} blocks {self.blocked_id}"
+
+
+class RecurringTaskTemplate(models.Model):
+    """
+    A task created in every one of ``projects`` on each occurrence of
+    ``schedule``, a cron expression or an RFC 5545 RRULE. Occurrences are
+    generated ahead of time up to ``generated_until``.
+    """
+    title = models.CharField(max_length=255)
+    description = models.TextField(blank=True, null=True)
+    priority = models.CharField(max_length=20, choices=Task.PRIORITY_CHOICES, default='medium')
+    assigned_to = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    projects = models.ManyToManyField(Project, related_name='recurring_task_templates')
+    schedule = models.CharField(max_length=255)
+    due_offset_days = models.PositiveIntegerField(default=0)
+    starts_at = models.DateTimeField(default=timezone.now)
+    generated_until = models.DateTimeField(blank=True, null=True, editable=False)
+    is_active = models.BooleanField(default=True)
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recurring_task_templates')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.title} ({self.schedule})"
+
+
 class Document(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
@@ -69,10 +153,18 @@ class Document(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['project', 'updated_at', 'id'], name='document_project_updated_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            Tombstone.bury('documents', [(self.pk, self.project_id)])
+            return super().delete(*args, **kwargs)
+
 
 class Comment(models.Model):
     content = models.TextField()
@@ -84,9 +176,20 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='comment_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.author.username} - {self.task.title} - {self.created_at.strftime('%Y-%m-%d %H:%M:%S')}"
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            project_id = self.project_id
+            if project_id is None:
+                project_id = Task.objects.filter(pk=self.task_id).values_list('project_id', flat=True).first()
+            Tombstone.bury('comments', [(self.pk, project_id)])
+            return super().delete(*args, **kwargs)
     
 
 class TimelineEvent(models.Model):
@@ -107,22 +210,145 @@ class TimelineEvent(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['project', '-created_at'], name='timeline_project_created_idx'),
+            models.Index(fields=['created_at'], name='timeline_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.event_type} - {self.project.name} - {self.created_at.strftime('%Y-%m-%d %H:%M:%S')}"
     
 
+class PrecomputedFeed(models.Model):
+    """
+    Marks a user whose activity feed is filled on write. ``project_ids`` are
+    the projects the stored entries cover.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    project_ids = models.JSONField(default=list)
+    # the entries only cover events newer than this: capped backfills stop
+    # here and a failed fan-out moves it up; older events come from the timeline
+    complete_after = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Feed of {self.user_id}"
+
+
+class FeedEntry(models.Model):
+    # plain ids so entries work against a partitioned timeline table
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    event_id = models.BigIntegerField()
+    project_id = models.BigIntegerField()
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-event_id'], name='feed_user_created_idx'),
+            models.Index(fields=['created_at'], name='feed_created_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'event_id'], name='unique_feed_entry'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_id} for {self.user_id}"
+
+
 class Notification(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
     title = models.CharField(max_length=255)
     message = models.TextField()
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='notification_user_created_idx'),
+            models.Index(fields=['created_at'], name='notification_created_idx'),
+            models.Index(fields=['user', 'updated_at', 'id'], name='notification_user_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.user.username} - {self.created_at.strftime('%Y-%m-%d %H:%M:%S')}"
-    
 
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            Tombstone.bury('notifications', [(self.pk, self.user_id)], scope='user_id')
+            return super().delete(*args, **kwargs)
+
+
+class ReminderState(models.Model):
+    """Tasks already included in a user's due-date digests, by reminder kind."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    # {"<task id>": "due_soon" | "overdue"} for tasks still inside the reminder window
+    sent = models.JSONField(default=dict)
+    last_digest_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Reminders of {self.user_id}"
+
+
+# Cold storage for rows moved out by the retention job. They keep the
+# original ids and carry plain ids instead of foreign keys, so archived rows
+# survive their project or user being deleted.
+class TimelineEventArchive(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    project_id = models.BigIntegerField(db_index=True)
+    event_type = models.CharField(max_length=50)
+    description = models.TextField(blank=True, null=True)
+    user_id = models.BigIntegerField()
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.event_type} - {self.project_id} - {self.created_at.strftime('%Y-%m-%d %H:%M:%S')}"
+
+
+class NotificationArchive(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    user_id = models.BigIntegerField(db_index=True)
+    title = models.CharField(max_length=255)
+    message = models.TextField()
+    is_read = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField(null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.title} - {self.user_id} - {self.created_at.strftime('%Y-%m-%d %H:%M:%S')}"
+
+
+class Tombstone(models.Model):
+    """
+    Record of a deleted row, kept so /api/sync/ can tell clients what to
+    remove. ``project_id`` scopes project data, ``user_id`` notifications.
+
+    They are written by the models' ``delete()`` for single deletes and in
+    bulk by the retention job, not by signals: a delete receiver would stop
+    Django from fast-deleting cascades and batches.
+    """
+    model = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    project_id = models.BigIntegerField(blank=True, null=True)
+    user_id = models.BigIntegerField(blank=True, null=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['project_id', 'deleted_at', 'id'], name='tombstone_project_idx'),
+            models.Index(fields=['user_id', 'deleted_at', 'id'], name='tombstone_user_idx'),
+            models.Index(fields=['deleted_at'], name='tombstone_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.model} {self.object_id} - {self.deleted_at.strftime('%Y-%m-%d %H:%M:%S')}"
+
+    @classmethod
+    def bury(cls, model, rows, scope='project_id', using=None):
+        """Insert one tombstone per ``(object id, scope id)`` in ``rows``."""
+        return cls.objects.using(using).bulk_create(
+            [cls(model=model, object_id=pk, **{scope: scope_id}) for pk, scope_id in rows]
+        )
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+from rest_framework.permissions import BasePermission
+
+
+def has_metrics_access(request):
+    """Staff users, or scrapers sending METRICS_TOKEN in X-Metrics-Token."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_staff:
+        return True
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    supplied = request.META.get('HTTP_X_METRICS_TOKEN')
+    return bool(token and supplied and constant_time_compare(token, supplied))
+
+
+class HasMetricsAccess(BasePermission):
+    """Staff users, or scrapers sending METRICS_TOKEN in X-Metrics-Token."""
+
+    def has_permission(self, request, view):
+        return has_metrics_access(request)
@@ -0,0 +1,192 @@
+import logging
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .dependencies import invalidate_graph
+from .models import RecurringTaskTemplate, Task
+
+try:
+    from dateutil.rrule import rrulestr
+except ImportError:
+    rrulestr = None
+
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidSchedule(ValueError):
+    pass
+
+
+CRON_ALIASES = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+}
+
+MONTH_NAMES = {name: i for i, name in enumerate(
+    ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'], 1)}
+DAY_NAMES = {name: i for i, name in enumerate(['sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat'])}
+
+
+def _parse_field(value, low, high, names=None):
+    values = set()
+    for part in value.lower().split(','):
+        step = 1
+        if '/' in part:
+            part, step = part.split('/', 1)
+            step = int(step)
+            if step < 1:
+                raise ValueError(step)
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = (int(names.get(x, x) if names else x) for x in part.split('-', 1))
+        else:
+            start = int(names.get(part, part) if names else part)
+            end = high if step > 1 else start
+        if not low <= start <= end <= high:
+            raise ValueError(part)
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """Five-field cron expression evaluated in the current time zone."""
+
+    def __init__(self, expression):
+        expression = CRON_ALIASES.get(expression.strip().lower(), expression)
+        fields = expression.split()
+        if len(fields) != 5:
+            raise InvalidSchedule("Cron expressions need five fields.")
+        try:
+            minutes = _parse_field(fields[0], 0, 59)
+            hours = _parse_field(fields[1], 0, 23)
+            self.days = _parse_field(fields[2], 1, 31)
+            self.months = _parse_field(fields[3], 1, 12, MONTH_NAMES)
+            # 7 is Sunday as well
+            self.weekdays = {day % 7 for day in _parse_field(fields[4], 0, 7, DAY_NAMES)}
+        except (ValueError, KeyError):
+            raise InvalidSchedule(f"Invalid cron expression: {expression}")
+        self.times = sorted(time(hour, minute) for hour in hours for minute in minutes)
+        # cron matches either day field when both are restricted
+        self.any_day = fields[2] != '*' and fields[4] != '*'
+
+    def matches_date(self, day):
+        if day.month not in self.months:
+            return False
+        in_month = day.day in self.days
+        in_week = (day.weekday() + 1) % 7 in self.weekdays
+        return in_month or in_week if self.any_day else in_month and in_week
+
+    def between(self, start, end):
+        """Occurrences in ``[start, end)``, walking days rather than minutes."""
+        tz = timezone.get_current_timezone()
+        day, last = timezone.localtime(start, tz).date(), timezone.localtime(end, tz).date()
+        while day <= last:
+            if self.matches_date(day):
+                for at in self.times:
+                    occurrence = timezone.make_aware(datetime.combine(day, at), tz)
+                    if start <= occurrence < end:
+                        yield occurrence
+            day += timedelta(days=1)
+
+
+class RRuleSchedule:
+    def __init__(self, expression, dtstart):
+        if rrulestr is None:
+            raise InvalidSchedule("RRULE schedules need python-dateutil.")
+        try:
+            self.rule = rrulestr(expression, dtstart=dtstart)
+        except (ValueError, TypeError):
+            raise InvalidSchedule(f"Invalid RRULE: {expression}")
+        # a DTSTART without a zone yields naive occurrences, which cannot be
+        # compared with the aware window passed to between()
+        first = next(iter(self.rule), None)
+        if first is not None and timezone.is_naive(first):
+            raise InvalidSchedule("RRULE DTSTART needs a time zone, e.g. DTSTART;TZID=Europe/Berlin:... "
+                                  "or a UTC time ending in Z.")
+
+    def between(self, start, end):
+        for occurrence in self.rule.between(start, end, inc=True):
+            if occurrence < end:
+                yield occurrence
+
+
+def parse_schedule(expression, dtstart=None):
+    upper = expression.strip().upper()
+    if upper.startswith(('RRULE:', 'DTSTART', 'FREQ=')):
+        return RRuleSchedule(expression, dtstart or timezone.now())
+    return CronSchedule(expression)
+
+
+def recurrence_key(template_id, project_id, occurrence):
+    return f"{template_id}:{project_id}:{occurrence.astimezone(dt_timezone.utc):%Y%m%dT%H%M}"
+
+
+def materialize(now=None, horizon_days=None, catchup_days=None, batch_size=None):
+    """
+    Create the tasks of every active template up to ``horizon_days`` ahead.
+    Each template resumes from its ``generated_until``, so windows missed
+    while the job was not running are caught up (at most ``catchup_days``
+    back). Every task carries a unique recurrence key and is inserted with
+    ``ignore_conflicts``, so reruns and overlapping runs never duplicate a
+    task. Returns the number of occurrences processed per template.
+    """
+    now = now or timezone.now()
+    horizon = now + timedelta(days=horizon_days or settings.RECURRING_TASK_HORIZON_DAYS)
+    oldest = now - timedelta(days=catchup_days or settings.RECURRING_TASK_CATCHUP_DAYS)
+    batch_size = batch_size or settings.RECURRING_TASK_BATCH_SIZE
+    through = RecurringTaskTemplate.projects.through
+
+    results = {}
+    templates = RecurringTaskTemplate.objects.filter(is_active=True).exclude(generated_until__gte=horizon)
+    for template in templates.iterator():
+        start = max(template.generated_until or template.starts_at, template.starts_at, oldest)
+        try:
+            occurrences = list(parse_schedule(template.schedule, template.starts_at).between(start, horizon))
+        except InvalidSchedule as exc:
+            logger.warning("Skipping recurring task template %s: %s", template.pk, exc)
+            continue
+        except Exception:
+            # one broken schedule must not stop the run for every other template
+            logger.exception("Could not evaluate the schedule of recurring task template %s", template.pk)
+            continue
+        project_ids = list(through.objects.filter(
+            recurringtasktemplate_id=template.pk
+        ).values_list('project_id', flat=True))
+
+        pending = []
+        with transaction.atomic():
+            for occurrence in occurrences:
+                due_date = timezone.localtime(occurrence).date() + timedelta(days=template.due_offset_days)
+                for project_id in project_ids:
+                    pending.append(Task(
+                        title=template.title,
+                        description=template.description,
+                        priority=template.priority,
+                        project_id=project_id,
+                        assigned_to_id=template.assigned_to_id,
+                        created_by_id=template.created_by_id,
+                        due_date=due_date,
+                        recurrence_key=recurrence_key(template.pk, project_id, occurrence),
+                    ))
+                    if len(pending) >= batch_size:
+                        Task.objects.bulk_create(pending, ignore_conflicts=True)
+                        pending = []
+            if pending:
+                Task.objects.bulk_create(pending, ignore_conflicts=True)
+            RecurringTaskTemplate.objects.filter(pk=template.pk).update(generated_until=horizon)
+
+        if occurrences:
+            # bulk_create skips the signals that keep the cached task graphs fresh
+            for project_id in project_ids:
+                invalidate_graph(project_id)
+        results[template.pk] = len(occurrences) * len(project_ids)
+    return results
@@ -0,0 +1,118 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+
+from .models import Notification, ReminderState, Task
+
+
+DUE_SOON = 'due_soon'
+OVERDUE = 'overdue'
+
+
+def candidate_tasks(today, soon_days, overdue_days):
+    """
+    Open, assigned tasks due in ``[today - overdue_days, today + soon_days]``.
+    The filter matches the partial ``task_open_due_idx`` and
+    ``task_open_assignee_due_idx`` indexes, so this is a range scan over the
+    window (or over the window of each assignee) rather than over every open
+    task.
+    """
+    return Task.objects.filter(
+        models.Q(assigned_to__isnull=False) & ~models.Q(status='done'),
+        due_date__gte=today - timedelta(days=overdue_days),
+        due_date__lte=today + timedelta(days=soon_days),
+    ).order_by()
+
+
+def assignee_batches(candidates, batch_size):
+    """
+    Ids of the users with candidate tasks, ascending, ``batch_size`` at a
+    time. The window is scanned once; the ids are small enough to hold.
+    """
+    user_ids = sorted(candidates.values_list('assigned_to_id', flat=True).distinct())
+    for start in range(0, len(user_ids), batch_size):
+        yield user_ids[start:start + batch_size]
+
+
+def digest_message(items, today, limit):
+    lines = []
+    for kind, heading in ((OVERDUE, "Overdue"), (DUE_SOON, "Due soon")):
+        rows = sorted((due_date, title, project) for k, due_date, title, project in items if k == kind)
+        if not rows:
+            continue
+        lines.append(f"{heading}:")
+        for due_date, title, project in rows[:limit]:
+            days = (due_date - today).days
+            span = f"{abs(days)} day{'' if abs(days) == 1 else 's'}"
+            when = "today" if days == 0 else f"in {span}" if days > 0 else f"{span} ago"
+            lines.append(f"- {title} ({project}), due {due_date.isoformat()} ({when})")
+        if len(rows) > limit:
+            lines.append(f"- and {len(rows) - limit} more")
+    return '\n'.join(lines)
+
+
+def send_digests(now=None, soon_days=None, overdue_days=None, batch_size=None):
+    """
+    Create one digest notification per assignee with the tasks that became
+    due soon or overdue since that user's last digest. ``ReminderState``
+    remembers what each user was already told; entries for tasks that left
+    the window are dropped, so the state stays as small as the window.
+    Assignees are handled ``batch_size`` at a time, each batch in its own
+    short transaction. Returns the number of digests created.
+    """
+    now = now or timezone.now()
+    today = timezone.localdate(now)
+    soon_days = settings.REMINDER_DUE_SOON_DAYS if soon_days is None else soon_days
+    overdue_days = settings.REMINDER_OVERDUE_DAYS if overdue_days is None else overdue_days
+    batch_size = batch_size or settings.REMINDER_BATCH_SIZE
+    limit = settings.REMINDER_DIGEST_MAX_ITEMS
+    candidates = candidate_tasks(today, soon_days, overdue_days)
+
+    # users with nothing left in the window only need their state cleared
+    ReminderState.objects.exclude(sent={}).exclude(
+        models.Exists(candidates.filter(assigned_to_id=models.OuterRef('user_id')))
+    ).update(sent={})
+
+    sent_total = 0
+    for user_ids in assignee_batches(candidates, batch_size):
+        by_user = defaultdict(list)
+        rows = candidates.filter(assigned_to_id__in=user_ids).values_list(
+            'id', 'assigned_to_id', 'title', 'due_date', 'project__name'
+        )
+        for task_id, user_id, title, due_date, project in rows:
+            by_user[user_id].append((task_id, OVERDUE if due_date < today else DUE_SOON, due_date, title, project))
+
+        with transaction.atomic():
+            states = ReminderState.objects.select_for_update().filter(
+                user_id__gte=user_ids[0], user_id__lte=user_ids[-1]
+            ).in_bulk()
+            notifications, new_states, changed_states = [], [], []
+            for user_id, tasks in by_user.items():
+                state = states.get(user_id)
+                sent = state.sent if state is not None else {}
+                current = {str(task_id): kind for task_id, kind, *_ in tasks}
+                new = [(kind, due_date, title, project) for task_id, kind, due_date, title, project in tasks
+                       if sent.get(str(task_id)) != kind]
+                if new:
+                    overdue = sum(1 for item in new if item[0] == OVERDUE)
+                    notifications.append(Notification(
+                        user_id=user_id,
+                        title=f"Task digest: {overdue} overdue, {len(new) - overdue} due soon",
+                        message=digest_message(new, today, limit),
+                    ))
+                if state is None:
+                    new_states.append(ReminderState(user_id=user_id, sent=current, last_digest_at=now))
+                elif current != sent:
+                    state.sent = current
+                    if new:
+                        state.last_digest_at = now
+                    changed_states.append(state)
+
+            Notification.objects.bulk_create(notifications)
+            ReminderState.objects.bulk_create(new_states)
+            ReminderState.objects.bulk_update(changed_states, ['sent', 'last_digest_at'])
+        sent_total += len(notifications)
+    return sent_total
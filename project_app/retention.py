@@ -0,0 +1,312 @@
+import gzip
+import json
+import os
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from .models import (
+    FeedEntry, Notification, NotificationArchive, TimelineEvent, TimelineEventArchive, Tombstone
+)
+
+
+ARCHIVE_MODELS = {
+    TimelineEvent: TimelineEventArchive,
+    Notification: NotificationArchive,
+}
+
+# models whose removed rows sync clients have to hear about, with the
+# tombstone name and scope column
+SYNCED_MODELS = {
+    Notification: ('notifications', 'user_id'),
+}
+
+
+def bury_rows(model, rows, using=DEFAULT_DB_ALIAS):
+    """Tombstones for a batch of removed ``rows`` (dicts with ``id``), if sync tracks ``model``."""
+    if model in SYNCED_MODELS:
+        name, scope = SYNCED_MODELS[model]
+        Tombstone.bury(name, [(row['id'], row[scope]) for row in rows], scope=scope, using=using)
+
+
+class NDJSONArchive:
+    """Append rows to a gzip-compressed NDJSON file, one file per run."""
+
+    def __init__(self, model, directory):
+        os.makedirs(directory, exist_ok=True)
+        stamp = timezone.now().strftime('%Y%m%dT%H%M%S')
+        self.path = os.path.join(directory, f'{model._meta.db_table}-{stamp}.ndjson.gz')
+        self._file = None
+
+    def write(self, rows):
+        if self._file is None:
+            self._file = gzip.open(self.path, 'at', encoding='utf-8')
+        for row in rows:
+            self._file.write(json.dumps(row, cls=DjangoJSONEncoder))
+            self._file.write('\n')
+        # sync-flush so everything written before a crash stays readable
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+class TableArchive:
+    """Copy rows into the model's cold table, skipping ids already archived."""
+
+    def __init__(self, model, using=DEFAULT_DB_ALIAS):
+        self.archive_model = ARCHIVE_MODELS[model]
+        self.using = using
+
+    def write(self, rows):
+        self.archive_model.objects.using(self.using).bulk_create(
+            [self.archive_model(**row) for row in rows],
+            ignore_conflicts=True
+        )
+
+    def close(self):
+        pass
+
+
+def get_archive(model, archive_format, using=DEFAULT_DB_ALIAS):
+    if archive_format == 'ndjson':
+        return NDJSONArchive(model, settings.RETENTION_ARCHIVE_DIR)
+    if archive_format == 'table':
+        return TableArchive(model, using=using)
+    raise ValueError(f"Unknown archive format '{archive_format}'.")
+
+
+def archive_rows(queryset, archive, batch_size, delete=True):
+    """
+    Move every row of ``queryset`` into ``archive`` in batches of
+    ``batch_size``. Each batch is archived and deleted in its own transaction,
+    so locks and undo stay bounded however many rows match.
+    """
+    model = queryset.model
+    fields = [field.attname for field in model._meta.concrete_fields]
+    queryset = queryset.order_by('created_at', 'pk')
+    total = 0
+    last = None
+
+    while True:
+        with transaction.atomic(using=queryset.db):
+            batch = queryset
+            if not delete and last is not None:
+                # nothing is removed, so page forward from the previous batch
+                batch = batch.filter(
+                    created_at__gte=last['created_at']
+                ).exclude(created_at=last['created_at'], pk__lte=last['id'])
+            rows = list(batch.values(*fields)[:batch_size])
+            if not rows:
+                break
+            archive.write(rows)
+            bury_rows(model, rows, using=queryset.db)
+            if delete:
+                model.objects.using(queryset.db).filter(pk__in=[row['id'] for row in rows]).delete()
+        total += len(rows)
+        last = rows[-1]
+    return total
+
+
+def delete_in_batches(queryset, batch_size):
+    model = queryset.model
+    fields = ['id', SYNCED_MODELS[model][1]] if model in SYNCED_MODELS else ['id']
+    total = 0
+    while True:
+        with transaction.atomic(using=queryset.db):
+            rows = list(queryset.values(*fields)[:batch_size])
+            if not rows:
+                break
+            bury_rows(model, rows, using=queryset.db)
+            model.objects.using(queryset.db).filter(pk__in=[row['id'] for row in rows]).delete()
+        total += len(rows)
+    return total
+
+
+def archive_before(model, cutoff, archive_format='ndjson', batch_size=None, using=DEFAULT_DB_ALIAS):
+    """Archive and remove rows of ``model`` created before ``cutoff``."""
+    batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+    archive = get_archive(model, archive_format, using=using)
+    queryset = model.objects.using(using).filter(created_at__lt=cutoff)
+    total = 0
+    try:
+        # whole monthly partitions past the cutoff are copied out and dropped
+        # instead of being deleted row by row
+        for name, lower, upper in expired_partitions(model, cutoff, using=using):
+            partition = queryset.filter(created_at__gte=lower, created_at__lt=upper)
+            total += archive_rows(partition, archive, batch_size, delete=False)
+            drop_partition(name, using=using)
+        total += archive_rows(queryset, archive, batch_size)
+    finally:
+        archive.close()
+    return total
+
+
+def purge_read_notifications(cutoff, batch_size=None, using=DEFAULT_DB_ALIAS):
+    """Delete read notifications created before ``cutoff``."""
+    batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+    queryset = Notification.objects.using(using).filter(is_read=True, created_at__lt=cutoff)
+    return delete_in_batches(queryset.order_by('created_at'), batch_size)
+
+
+def purge_tombstones(cutoff, batch_size=None, using=DEFAULT_DB_ALIAS):
+    """Delete sync tombstones recorded before ``cutoff``."""
+    batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+    queryset = Tombstone.objects.using(using).filter(deleted_at__lt=cutoff)
+    return delete_in_batches(queryset.order_by('deleted_at'), batch_size)
+
+
+def purge_feed_entries(cutoff, batch_size=None, using=DEFAULT_DB_ALIAS):
+    """Delete precomputed feed entries of events older than ``cutoff``."""
+    batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+    queryset = FeedEntry.objects.using(using).filter(created_at__lt=cutoff)
+    return delete_in_batches(queryset.order_by('created_at'), batch_size)
+
+
+def run_retention(archive_format='ndjson', batch_size=None, using=DEFAULT_DB_ALIAS):
+    """Entry point for the management command and periodic tasks."""
+    now = timezone.now()
+    return {
+        'read_notifications_deleted': purge_read_notifications(
+            now - timedelta(days=settings.NOTIFICATION_READ_RETENTION_DAYS),
+            batch_size=batch_size, using=using
+        ),
+        'notifications_archived': archive_before(
+            Notification, now - timedelta(days=settings.NOTIFICATION_RETENTION_DAYS),
+            archive_format=archive_format, batch_size=batch_size, using=using
+        ),
+        'timeline_events_archived': archive_before(
+            TimelineEvent, now - timedelta(days=settings.TIMELINE_RETENTION_DAYS),
+            archive_format=archive_format, batch_size=batch_size, using=using
+        ),
+        'feed_entries_deleted': purge_feed_entries(
+            now - timedelta(days=settings.TIMELINE_RETENTION_DAYS),
+            batch_size=batch_size, using=using
+        ),
+        'tombstones_deleted': purge_tombstones(
+            now - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS),
+            batch_size=batch_size, using=using
+        ),
+    }
+
+
+# Postgres time-based partitioning. Partitions are monthly ranges over
+# created_at named <table>_YYYYMM, plus a <table>_default catch-all.
+
+def _month_start(value):
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(value):
+    return _month_start(_month_start(value) + timedelta(days=32))
+
+
+def is_partitioned(model, using=DEFAULT_DB_ALIAS):
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass",
+            [model._meta.db_table]
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions(model, using=DEFAULT_DB_ALIAS):
+    """Return ``(name, lower, upper)`` for each monthly partition of ``model``."""
+    if not is_partitioned(model, using=using):
+        return []
+    table = model._meta.db_table
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = %s::regclass",
+            [table]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = []
+    for name in sorted(names):
+        suffix = name[len(table) + 1:]
+        try:
+            lower = datetime.strptime(suffix, '%Y%m').replace(tzinfo=dt_timezone.utc)
+        except ValueError:
+            continue
+        partitions.append((name, lower, _next_month(lower)))
+    return partitions
+
+
+def expired_partitions(model, cutoff, using=DEFAULT_DB_ALIAS):
+    return [partition for partition in list_partitions(model, using=using) if partition[2] <= cutoff]
+
+
+def drop_partition(name, using=DEFAULT_DB_ALIAS):
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {connection.ops.quote_name(name)}')
+
+
+def ensure_partitions(model, months_ahead=3, using=DEFAULT_DB_ALIAS):
+    """Create the monthly partitions from this month to ``months_ahead`` ahead."""
+    if not is_partitioned(model, using=using):
+        return []
+    connection = connections[using]
+    table = model._meta.db_table
+    created = []
+    lower = _month_start(timezone.now())
+    with connection.cursor() as cursor:
+        for _ in range(months_ahead + 1):
+            upper = _next_month(lower)
+            name = f'{table}_{lower:%Y%m}'
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {connection.ops.quote_name(name)} '
+                f'PARTITION OF {connection.ops.quote_name(table)} FOR VALUES FROM (%s) TO (%s)',
+                [lower, upper]
+            )
+            created.append(name)
+            lower = upper
+    return created
+
+
+def partition_table_sql(model, using=DEFAULT_DB_ALIAS):
+    """
+    Return the statements that turn ``model``'s table into a table
+    range-partitioned on created_at. They copy the whole table, so review
+    them and run them in a maintenance window.
+    """
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    table = model._meta.db_table
+    legacy = f'{table}_legacy'
+    statements = [
+        f'ALTER TABLE {quote(table)} RENAME TO {quote(legacy)}',
+        f'CREATE TABLE {quote(table)} (LIKE {quote(legacy)} INCLUDING DEFAULTS INCLUDING IDENTITY) '
+        f'PARTITION BY RANGE ("created_at")',
+        f'CREATE TABLE {quote(table + "_default")} PARTITION OF {quote(table)} DEFAULT',
+        f'INSERT INTO {quote(table)} SELECT * FROM {quote(legacy)}',
+        f'DROP TABLE {quote(legacy)}',
+        # the partition key has to be part of the primary key
+        f'ALTER TABLE {quote(table)} ADD PRIMARY KEY ("id", "created_at")',
+        f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+        f"COALESCE((SELECT MAX(\"id\") FROM {quote(table)}), 1))",
+    ]
+    for field in model._meta.concrete_fields:
+        if field.remote_field is None:
+            continue
+        target = field.remote_field.model._meta
+        statements.append(
+            f'ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(f"{table}_{field.column}_fk")} '
+            f'FOREIGN KEY ({quote(field.column)}) REFERENCES {quote(target.db_table)} '
+            f'({quote(target.pk.column)}) DEFERRABLE INITIALLY DEFERRED'
+        )
+    with connection.schema_editor(collect_sql=True) as editor:
+        for index in model._meta.indexes:
+            editor.add_index(model, index)
+    statements.extend(str(statement) for statement in editor.collected_sql)
+    return statements
@@ -0,0 +1,88 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+
+# per-request routing state, set up by ReplicaRoutingMiddleware
+_routing_state = ContextVar('replica_routing_state', default=None)
+
+
+class RoutingState:
+    def __init__(self, request, pinned=False):
+        self.request = request
+        self.pinned = pinned
+        self.wrote = False
+        self.checked = False
+
+
+def get_replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def sticky_cache_key(user_id):
+    return f'replica-pin:{user_id}'
+
+
+def begin_request(request, pinned=False):
+    return _routing_state.set(RoutingState(request, pinned=pinned))
+
+
+def end_request(token):
+    _routing_state.reset(token)
+
+
+def current_state():
+    return _routing_state.get()
+
+
+def pin_to_primary():
+    """Send every remaining read of the current request to the primary."""
+    state = _routing_state.get()
+    if state is not None:
+        state.pinned = True
+
+
+def _use_primary():
+    state = _routing_state.get()
+    # outside of a request (shell, management commands, workers) we always
+    # read from the primary
+    if state is None or state.pinned or state.wrote:
+        return True
+
+    if not state.checked:
+        user = getattr(state.request, 'user', None)
+        if user is not None and user.is_authenticated:
+            state.checked = True
+            state.pinned = cache.get(sticky_cache_key(user.pk)) is not None
+    return state.pinned
+
+
+class ReplicaRouter:
+    """
+    Route project_app reads to the aliases listed in DATABASE_REPLICAS and
+    every write to the primary. A user that wrote recently keeps reading from
+    the primary for DATABASE_REPLICA_STICKY_SECONDS (read-your-writes).
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != 'project_app':
+            return None
+        replicas = get_replicas()
+        if not replicas or _use_primary():
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _routing_state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
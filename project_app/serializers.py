@@ -1,8 +1,132 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import Project, Task, Document, Comment, TimelineEvent, Notification
+from rest_framework.permissions import SAFE_METHODS
+from .models import Project, Task, TaskDependency, RecurringTaskTemplate, Document, Comment, TimelineEvent, Notification
 from django.contrib.auth.models import User
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .instrumentation import serialization_timer
+from .membership import ProjectMember, missing_user_ids, replace_members
+from .recurrence import InvalidSchedule, parse_schedule
 
-class UserSerializer(serializers.ModelSerializer):
+
+def _query_param_list(request, name):
+    return {value.strip() for value in request.query_params.get(name, '').split(',') if value.strip()}
+
+
+def related_count(model, field):
+    """Count of ``model`` rows whose ``field`` points at the outer row."""
+    counts = model.objects.filter(**{field: models.OuterRef('pk')}).order_by().values(field)
+    return Coalesce(models.Subquery(counts.annotate(count=models.Count('*')).values('count')), 0)
+
+
+class DynamicFieldsMixin:
+    """
+    Response shaping driven by the request: ``?fields=`` keeps only the listed
+    fields, ``?omit=`` drops fields and ``?expand=`` adds the fields named in
+    ``Meta.expandable_fields``, which are left out otherwise. Only applies to
+    the top-level serializer of a request.
+
+    ``prepare_queryset()`` trims a queryset to what the selected fields read:
+    ``only()`` on the columns used, ``select_related()`` for related objects,
+    and the ``Meta.annotations`` / ``Meta.prefetch`` entries of the selected
+    fields.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._response_fields = None
+        request = self.context.get('request')
+        if request is None:
+            return
+        selected = self.selected_field_names(request, self.fields)
+        safe = request.method in SAFE_METHODS
+        for name, field in list(self.fields.items()):
+            if name in selected or field.write_only:
+                continue
+            # writable fields still have to validate input on writes
+            if safe or field.read_only:
+                self.fields.pop(name)
+        if not safe:
+            self._response_fields = selected
+
+    @classmethod
+    def selected_field_names(cls, request, fields):
+        expandable = set(getattr(cls.Meta, 'expandable_fields', []))
+        expand = _query_param_list(request, 'expand') & expandable
+        only = _query_param_list(request, 'fields')
+        omit = _query_param_list(request, 'omit')
+        selected = set()
+        for name in fields:
+            if name in expandable and name not in expand:
+                continue
+            if only and name not in only and name not in expand:
+                continue
+            if name in omit:
+                continue
+            selected.add(name)
+        return selected
+
+    def to_representation(self, instance):
+        parent = self.parent
+        if parent is None or (isinstance(parent, serializers.ListSerializer) and parent.parent is None):
+            # time top-level objects only; nested ones are part of their parent
+            with serialization_timer():
+                data = super().to_representation(instance)
+        else:
+            data = super().to_representation(instance)
+        if self._response_fields is not None:
+            for name in list(data):
+                if name not in self._response_fields:
+                    data.pop(name)
+        return data
+
+    @classmethod
+    def prepare_queryset(cls, queryset, request):
+        serializer = cls(context={'request': request})
+        meta = cls.Meta
+        model = queryset.model
+        safe = request.method in SAFE_METHODS
+        columns = {model._meta.pk.name}
+        related = set()
+
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            columns.update(getattr(meta, 'source_fields', {}).get(name, []))
+            if field.source == '*' or isinstance(field, serializers.SerializerMethodField):
+                continue
+            parts = field.source.split('.')
+            try:
+                model_field = model._meta.get_field(parts[0])
+            except FieldDoesNotExist:
+                continue
+            if model_field.many_to_many or model_field.one_to_many:
+                continue
+            columns.add(parts[0])
+            if model_field.is_relation and (isinstance(field, serializers.BaseSerializer) or len(parts) > 1):
+                related.add(parts[0])
+
+        if related:
+            queryset = queryset.select_related(*related)
+        # after a write the instance is rendered from fresh queries instead
+        if not safe:
+            return queryset
+
+        for name, annotation in getattr(meta, 'annotations', {}).items():
+            if name in serializer.fields:
+                queryset = queryset.annotate(**{name: annotation()})
+        for name, prefetch in getattr(meta, 'prefetch', {}).items():
+            if name in serializer.fields:
+                queryset = queryset.prefetch_related(prefetch())
+        for ordering in model._meta.ordering:
+            columns.add(ordering.lstrip('-'))
+        return queryset.only(*columns)
+
+
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'first_name', 'last_name']
@@ -31,32 +155,74 @@ class UserRegisterSerializer(serializers.ModelSerializer):
         return user
     
 
-class ProjectSerializer(serializers.ModelSerializer):
+class ProjectSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """
+    Members are summarised as ``members_count`` and ``members_preview``; the
+    full ``members`` list is only included with ``?expand=members``.
+    """
     created_by = UserSerializer(read_only=True)
     members = UserSerializer(many=True, read_only=True)
     member_ids = serializers.ListField(
         child=serializers.IntegerField(), write_only=True, required=False
     )
+    members_count = serializers.SerializerMethodField()
+    members_preview = serializers.SerializerMethodField()
     tasks_count = serializers.SerializerMethodField()
     documents_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Project
         fields = ['id', 'name', 'description', 'status', 'created_by', 'members',
-                  'member_ids', 'start_date', 'end_date','created_at', 'updated_at',
-                  'tasks_count', 'documents_count']
+                  'member_ids', 'members_count', 'members_preview', 'start_date',
+                  'end_date','created_at', 'updated_at', 'tasks_count', 'documents_count']
+        expandable_fields = ['members']
+        annotations = {
+            'members_count': lambda: related_count(ProjectMember, 'project'),
+            'tasks_count': lambda: related_count(Task, 'project'),
+            'documents_count': lambda: related_count(Document, 'project'),
+        }
+        prefetch = {
+            'members': lambda: 'members',
+            'members_preview': lambda: models.Prefetch(
+                'members',
+                queryset=User.objects.order_by('id')[:settings.PROJECT_MEMBERS_PREVIEW_SIZE],
+                to_attr='member_preview'
+            ),
+        }
+
+    def get_members_count(self, obj):
+        if hasattr(obj, 'members_count'):
+            return obj.members_count
+        return obj.members.count()
+
+    def get_members_preview(self, obj):
+        # filled by a sliced prefetch in the project views
+        preview = getattr(obj, 'member_preview', None)
+        if preview is None:
+            preview = obj.members.order_by('id')[:settings.PROJECT_MEMBERS_PREVIEW_SIZE]
+        return UserSerializer(preview, many=True).data
         
     def get_tasks_count(self, obj):
+        if hasattr(obj, 'tasks_count'):
+            return obj.tasks_count
         return obj.tasks.count()
     
     def get_documents_count(self, obj):
+        if hasattr(obj, 'documents_count'):
+            return obj.documents_count
         return obj.documents.count()
     
+    def validate_member_ids(self, value):
+        missing = missing_user_ids(value)
+        if missing:
+            raise serializers.ValidationError(f"Users do not exist: {missing}")
+        return value
+    
     def create(self, validated_data):
         member_ids = validated_data.pop('member_ids', [])
         project = Project.objects.create(**validated_data)
         if member_ids:
-            project.members.set(member_ids)
+            replace_members(project, member_ids, notify=False)
         return project
     
     def update(self, instance, validated_data):
@@ -65,11 +231,21 @@ class ProjectSerializer(serializers.ModelSerializer):
             setattr(instance, attr, value)
         instance.save()
         if member_ids is not None:
-            instance.members.set(member_ids)
+            replace_members(instance, member_ids, notify=False)
         return instance
+
+
+class ProjectMembersSerializer(serializers.Serializer):
+    user_ids = serializers.ListField(child=serializers.IntegerField())
+
+    def validate_user_ids(self, value):
+        missing = missing_user_ids(value)
+        if missing:
+            raise serializers.ValidationError(f"Users do not exist: {missing}")
+        return value
     
 
-class TaskSerializer(serializers.ModelSerializer):
+class TaskSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     assigned_to = UserSerializer(read_only=True)
     created_by = UserSerializer(read_only=True)
     project_name = serializers.CharField(source='project.name', read_only=True)
@@ -79,12 +255,98 @@ class TaskSerializer(serializers.ModelSerializer):
         model = Task
         fields = ['id', 'title', 'description', 'project', 'project_name', 
                  'assigned_to', 'status', 'priority', 'due_date', 'created_by',
-                 'created_at', 'updated_at', 'comments_count']
+                 'created_at', 'updated_at', 'comments_count', 'version']
+        read_only_fields = ['version']
+        annotations = {
+            'comments_count': lambda: related_count(Comment, 'task'),
+        }
 
     def get_comments_count(self, obj):
+        if hasattr(obj, 'comments_count'):
+            return obj.comments_count
         return obj.comments.count()
+
+    def validate_project(self, value):
+        instance = self.instance
+        if instance is None or value.pk == instance.project_id:
+            return value
+        # dependencies are scoped to one project and would be left pointing across projects
+        if TaskDependency.objects.filter(models.Q(blocker=instance) | models.Q(blocked=instance)).exists():
+            raise serializers.ValidationError("Remove this task's dependencies before moving it to another project.")
+        return value
+
+    def update(self, instance, validated_data):
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        # write only the submitted columns; save() bumps the version
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        return instance
     
 
+class RecurringTaskTemplateSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    created_by = UserSerializer(read_only=True)
+
+    class Meta:
+        model = RecurringTaskTemplate
+        fields = ['id', 'title', 'description', 'priority', 'assigned_to', 'projects', 'schedule',
+                  'due_offset_days', 'starts_at', 'generated_until', 'is_active', 'created_by',
+                  'created_at', 'updated_at']
+
+    def validate_schedule(self, value):
+        try:
+            parse_schedule(value)
+        except InvalidSchedule as exc:
+            raise serializers.ValidationError(str(exc))
+        return value
+
+    def validate_projects(self, value):
+        user = self.context['request'].user
+        allowed = set(Project.objects.filter(
+            models.Q(created_by=user) | models.Q(members=user)
+        ).values_list('pk', flat=True))
+        denied = sorted(project.pk for project in value if project.pk not in allowed)
+        if denied:
+            raise serializers.ValidationError(f"No access to projects: {denied}")
+        return value
+
+    def update(self, instance, validated_data):
+        if {'projects', 'schedule', 'starts_at'} & set(validated_data) and instance.generated_until:
+            # regenerate the upcoming window; existing occurrences are skipped by their keys
+            instance.generated_until = min(instance.generated_until, timezone.now())
+        return super().update(instance, validated_data)
+
+
+class ProjectCloneSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=255, required=False)
+    start_date = serializers.DateField(required=False)
+    shift_days = serializers.IntegerField(required=False)
+    reset_status = serializers.BooleanField(default=True)
+    include_members = serializers.BooleanField(default=True)
+    include_documents = serializers.BooleanField(default=False)
+    include_dependencies = serializers.BooleanField(default=True)
+
+    def validate(self, attrs):
+        if 'start_date' in attrs and 'shift_days' in attrs:
+            raise serializers.ValidationError("Give either start_date or shift_days, not both.")
+        return attrs
+
+
+class TaskDependencySerializer(serializers.Serializer):
+    blocked_by = serializers.IntegerField()
+
+
+class TaskTransitionSerializer(serializers.Serializer):
+    status = serializers.ChoiceField(choices=Task.STATUS_CHOICES, required=False)
+    assigned_to = serializers.IntegerField(allow_null=True, required=False)
+    version = serializers.IntegerField(required=False)
+    from_status = serializers.ChoiceField(choices=Task.STATUS_CHOICES, required=False)
+
+    def validate(self, attrs):
+        if 'status' not in attrs and 'assigned_to' not in attrs:
+            raise serializers.ValidationError("Give a status and/or assigned_to.")
+        return attrs
+
+
 class TaskAssignSerializer(serializers.Serializer):
     user_id = serializers.IntegerField()
 
@@ -96,7 +358,7 @@ class TaskAssignSerializer(serializers.Serializer):
         return value
     
 
-class DocumentSerializer(serializers.ModelSerializer):
+class DocumentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     uploaded_by = UserSerializer(read_only=True)
     project_name = serializers.CharField(source='project.name', read_only=True)
     file_size = serializers.SerializerMethodField()
@@ -105,6 +367,7 @@ class DocumentSerializer(serializers.ModelSerializer):
         model = Document
         fields = ['id', 'name', 'file', 'project', 'project_name', 'uploaded_by',
                  'description', 'created_at', 'updated_at', 'file_size']
+        source_fields = {'file_size': ['file']}
 
     def get_file_size(self, obj):
         if obj.file:
@@ -112,7 +375,7 @@ class DocumentSerializer(serializers.ModelSerializer):
         return 0
     
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     project_name = serializers.CharField(source='project.name', read_only=True)
     task_title = serializers.CharField(source='task.title', read_only=True)
@@ -123,7 +386,7 @@ class CommentSerializer(serializers.ModelSerializer):
                  'task', 'task_title', 'created_at', 'updated_at']
 
 
-class TimelineEventSerializer(serializers.ModelSerializer):
+class TimelineEventSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     project_name = serializers.CharField(source='project.name', read_only=True)
 
@@ -133,7 +396,7 @@ class TimelineEventSerializer(serializers.ModelSerializer):
                  'user', 'created_at']
 
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Notification
         fields = ['id', 'title', 'message', 'is_read', 'created_at']
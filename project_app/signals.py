@@ -0,0 +1,27 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .dependencies import invalidate_graph
+from .models import Task, TaskDependency
+
+
+@receiver(pre_save, sender=Task)
+def remember_task_project(sender, instance, update_fields=None, **kwargs):
+    # a task moved to another project must also drop out of the old project's graph
+    instance._previous_project_id = None
+    if instance._state.adding or (update_fields is not None and 'project' not in update_fields):
+        return
+    instance._previous_project_id = (
+        Task.objects.filter(pk=instance.pk).values_list('project_id', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+@receiver(post_save, sender=TaskDependency)
+@receiver(post_delete, sender=TaskDependency)
+def task_graph_changed(sender, instance, **kwargs):
+    invalidate_graph(instance.project_id)
+    previous = getattr(instance, '_previous_project_id', None)
+    if previous is not None and previous != instance.project_id:
+        invalidate_graph(previous)
@@ -0,0 +1,161 @@
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db import models
+from django.utils import timezone
+
+from .models import Project, Task, Document, Comment, Notification, Tombstone
+from .serializers import (
+    ProjectSerializer, TaskSerializer, DocumentSerializer, CommentSerializer, NotificationSerializer
+)
+
+
+TOKEN_SALT = 'project_app.sync'
+
+# data scoped by project: name -> (model, serializer, filter for a set of project ids)
+PROJECT_DATA = {
+    'projects': (Project, ProjectSerializer, lambda ids: models.Q(pk__in=ids)),
+    'tasks': (Task, TaskSerializer, lambda ids: models.Q(project_id__in=ids)),
+    'comments': (Comment, CommentSerializer,
+                 lambda ids: models.Q(project_id__in=ids) | models.Q(task__project_id__in=ids)),
+    'documents': (Document, DocumentSerializer, lambda ids: models.Q(project_id__in=ids)),
+}
+
+
+class InvalidSyncToken(Exception):
+    pass
+
+
+def encode_token(state):
+    return signing.dumps(state, salt=TOKEN_SALT, compress=True)
+
+
+def decode_token(token):
+    try:
+        state = signing.loads(token, salt=TOKEN_SALT)
+    except signing.BadSignature:
+        raise InvalidSyncToken("Invalid sync token.")
+    if not isinstance(state, dict) or state.get('v') != 1:
+        raise InvalidSyncToken("Invalid sync token.")
+    return state
+
+
+def _cursor(value, pk=None):
+    return [value.isoformat(), pk]
+
+
+def _page(queryset, cursor, horizon, limit, field='updated_at'):
+    """
+    One keyset page of ``queryset`` ordered by (``field``, pk), after
+    ``cursor`` and up to ``horizon``. Returns the rows, the cursor to resume
+    from and whether more rows are waiting.
+    """
+    if cursor is not None:
+        after, pk = datetime.fromisoformat(cursor[0]), cursor[1]
+        if pk is None:
+            queryset = queryset.filter(**{f'{field}__gt': after})
+        else:
+            queryset = queryset.filter(
+                models.Q(**{f'{field}__gt': after}) | models.Q(**{field: after, 'pk__gt': pk})
+            )
+    rows = list(queryset.filter(**{f'{field}__lte': horizon}).order_by(field, 'pk')[:limit + 1])
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, _cursor(getattr(rows[-1], field), rows[-1].pk), True
+    return rows, _cursor(horizon), False
+
+
+def accessible_project_ids(user):
+    return set(Project.objects.filter(
+        models.Q(created_by=user) | models.Q(members=user)
+    ).values_list('pk', flat=True).distinct())
+
+
+def build_sync(request, token=None):
+    """
+    Changes visible to ``request.user`` since ``token``. Rows of known
+    projects are read from the ``updated_at`` indexes past per-type cursors
+    and deletions come from tombstones, so the cost follows the size of the
+    change. Projects the user gained access to are backfilled in pages;
+    projects the user lost access to are reported as deleted and clients drop
+    everything that belongs to them.
+    """
+    user = request.user
+    now = timezone.now()
+    # rows committed slightly after their timestamp must not fall behind a cursor
+    horizon = now - timedelta(seconds=settings.SYNC_LAG_SECONDS)
+    limit = settings.SYNC_PAGE_SIZE
+
+    state = decode_token(token) if token else None
+    reset = False
+    if state is not None:
+        deleted_since = datetime.fromisoformat(state['d'][0])
+        if deleted_since < now - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS):
+            # tombstones this client needs may already be purged
+            state, reset = None, True
+    if state is None:
+        state = {
+            'v': 1,
+            'c': {name: _cursor(horizon) for name in PROJECT_DATA},
+            'b': {},
+            'p': [],
+            'n': [],
+            'd': _cursor(horizon),
+        }
+        state['c']['notifications'] = None
+
+    accessible = accessible_project_ids(user)
+    known = set(state['p']) & accessible
+    backfill = set(state['n']) & accessible
+    lost = (set(state['p']) | set(state['n'])) - accessible
+    if not backfill:
+        backfill = accessible - known
+        state['b'] = {}
+
+    changes = {name: [] for name in [*PROJECT_DATA, 'notifications']}
+    deleted = {name: set() for name in changes}
+    deleted['projects'].update(lost)
+    has_more = False
+    backfill_more = False
+
+    for name, (model, serializer_class, scope) in PROJECT_DATA.items():
+        for ids, cursors in ((known, state['c']), (backfill, state['b'])):
+            if not ids:
+                continue
+            queryset = serializer_class.prepare_queryset(model.objects.filter(scope(ids)), request)
+            rows, cursors[name], more = _page(queryset, cursors.get(name), horizon, limit)
+            changes[name].extend(serializer_class(rows, many=True, context={'request': request}).data)
+            has_more |= more
+            if ids is backfill:
+                backfill_more |= more
+
+    queryset = NotificationSerializer.prepare_queryset(Notification.objects.filter(user=user), request)
+    rows, state['c']['notifications'], more = _page(queryset, state['c'].get('notifications'), horizon, limit)
+    changes['notifications'] = NotificationSerializer(rows, many=True, context={'request': request}).data
+    has_more |= more
+
+    # backfilled projects too: rows sent on an earlier page may be deleted before
+    # the backfill ends, while the tombstone cursor keeps moving
+    tombstones = Tombstone.objects.filter(
+        models.Q(project_id__in=known | backfill) | models.Q(user_id=user.pk)
+    )
+    rows, state['d'], more = _page(tombstones, state['d'], horizon, limit, field='deleted_at')
+    for tombstone in rows:
+        deleted[tombstone.model].add(tombstone.object_id)
+    has_more |= more
+
+    if backfill and not backfill_more:
+        known |= backfill
+        backfill = set()
+        state['b'] = {}
+    state['p'], state['n'] = sorted(known), sorted(backfill)
+    has_more |= bool(backfill) or bool(accessible - known)
+
+    return {
+        'token': encode_token(state),
+        'has_more': has_more,
+        'reset': reset,
+        'changes': changes,
+        'deleted': {name: sorted(ids) for name, ids in deleted.items()},
+    }
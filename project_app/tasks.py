@@ -0,0 +1,17 @@
+from .recurrence import materialize
+from .reminders import send_digests
+
+try:
+    from celery import shared_task
+except ImportError:
+    shared_task = None
+
+
+if shared_task is not None:
+    @shared_task(name='project_app.tasks.generate_recurring_tasks', ignore_result=True)
+    def generate_recurring_tasks():
+        return sum(materialize().values())
+
+    @shared_task(name='project_app.tasks.send_task_reminders', ignore_result=True)
+    def send_task_reminders():
+        return send_digests()
@@ -1,3 +1,1194 @@
-from django.test import TestCase
+import gzip
+import json
+import tempfile
+from datetime import datetime, timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import get_commands
+from django.db import connection, models as django_models
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import admin as project_admin, checks, cloning, recurrence, reminders, retention, transitions
+from .benchmarks import baseline, data as bench_data, micro
+from .models import (
+    Comment, Document, FeedEntry, Notification, NotificationArchive, PrecomputedFeed, Project, RecurringTaskTemplate,
+    ReminderState, Task, TaskDependency, TimelineEvent, TimelineEventArchive, Tombstone
+)
+from .instrumentation import registry
+from .middleware import CompressionMiddleware, TimelineBufferMiddleware
+from .renderers import FastJSONRenderer
+from .routers import ReplicaRouter
+from .timeline import TimelineBuffer, TimelineFlushError, record_event, timeline_buffer
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], DATABASE_REPLICA_STICKY_SECONDS=60)
+class ReplicaRoutingTests(TestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='alice', password='password123')
+        Project.objects.create(name='Primary only', created_by=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_router_outside_request_uses_primary(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Project), 'default')
+        self.assertEqual(router.db_for_write(Task), 'default')
+        self.assertIsNone(router.db_for_read(User))
+
+    def test_list_reads_from_replica(self):
+        # the replica file never saw the project written to the primary
+        response = self.client.get('/api/projects/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 0)
+
+    def test_write_pins_user_to_primary(self):
+        response = self.client.post('/api/projects/', {'name': 'New', 'start_date': '2025-01-01'}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        response = self.client.get('/api/projects/')
+        self.assertEqual(response.data['count'], 2)
+
+        # once the stickiness window is gone reads go back to the replica
+        cache.clear()
+        response = self.client.get('/api/projects/')
+        self.assertEqual(response.data['count'], 0)
+
+    def test_stickiness_is_per_user(self):
+        self.client.post('/api/projects/', {'name': 'New', 'start_date': '2025-01-01'}, format='json')
+
+        other = User.objects.create_user(username='bob', password='password123')
+        client = APIClient()
+        client.force_authenticate(other)
+        response = client.get('/api/projects/')
+        self.assertEqual(response.data['count'], 0)
+
+    def test_replicas_require_shared_cache(self):
+        self.assertEqual([error.id for error in checks.check_replica_cache(None)], ['project_app.E001'])
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache'}}
+        with override_settings(CACHES=shared):
+            self.assertEqual(checks.check_replica_cache(None), [])
+
+
+class RetentionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='password123')
+        self.project = Project.objects.create(name='Project', created_by=self.user)
+        self.old = timezone.now() - timedelta(days=400)
+        for i in range(5):
+            TimelineEvent.objects.create(project=self.project, event_type='task_created', user=self.user)
+        TimelineEvent.objects.filter(pk__in=TimelineEvent.objects.values('pk')[:3]).update(created_at=self.old)
+
+    def test_archive_to_table_in_batches(self):
+        archived = retention.archive_before(
+            TimelineEvent, timezone.now() - timedelta(days=365), archive_format='table', batch_size=2
+        )
+        self.assertEqual(archived, 3)
+        self.assertEqual(TimelineEvent.objects.count(), 2)
+        self.assertEqual(TimelineEventArchive.objects.count(), 3)
+
+    def test_archive_to_ndjson(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(RETENTION_ARCHIVE_DIR=directory):
+            archive = retention.NDJSONArchive(TimelineEvent, directory)
+            queryset = TimelineEvent.objects.filter(created_at__lt=timezone.now() - timedelta(days=365))
+            self.assertEqual(retention.archive_rows(queryset, archive, batch_size=2), 3)
+            archive.close()
+            with gzip.open(archive.path, 'rt') as f:
+                rows = [json.loads(line) for line in f]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['project_id'], self.project.pk)
+        self.assertEqual(TimelineEvent.objects.count(), 2)
+
+    def test_purge_only_old_read_notifications(self):
+        for is_read in (True, False):
+            Notification.objects.create(user=self.user, title='t', message='m', is_read=is_read)
+        Notification.objects.create(user=self.user, title='recent', message='m', is_read=True)
+        Notification.objects.exclude(title='recent').update(created_at=self.old)
+
+        deleted = retention.purge_read_notifications(timezone.now() - timedelta(days=30), batch_size=1)
+        self.assertEqual(deleted, 1)
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertFalse(NotificationArchive.objects.exists())
+
+    def test_purges_write_tombstones_per_batch(self):
+        for _ in range(4):
+            Notification.objects.create(user=self.user, title='t', message='m', is_read=True)
+        Notification.objects.update(created_at=self.old)
+
+        # each batch is one select, one tombstone insert and one delete inside
+        # a savepoint; a last, empty batch ends the loop
+        with self.assertNumQueries(2 * 5 + 3):
+            retention.purge_read_notifications(timezone.now() - timedelta(days=30), batch_size=2)
+        tombstones = Tombstone.objects.filter(model='notifications', user_id=self.user.pk)
+        self.assertEqual(tombstones.count(), 4)
+
+
+class TimelineBufferTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='password123')
+        self.project = Project.objects.create(name='Project', created_by=self.user)
+        timeline_buffer.discard()
+
+    def event(self):
+        return TimelineEvent(project=self.project, event_type='task_created', user=self.user)
+
+    def test_flushes_when_full(self):
+        buffer = TimelineBuffer(max_size=3, max_age=60)
+        buffer.add(self.event())
+        buffer.add(self.event())
+        self.assertEqual(TimelineEvent.objects.count(), 0)
+        # one insert for the batch and one lookup of precomputed feeds to fan
+        # out to, each in a savepoint
+        with self.assertNumQueries(6):
+            buffer.add(self.event())
+        self.assertEqual(TimelineEvent.objects.count(), 3)
+        self.assertEqual(len(buffer), 0)
+
+    def test_flushes_when_oldest_event_expires(self):
+        buffer = TimelineBuffer(max_size=100, max_age=0)
+        buffer.add(self.event())
+        self.assertEqual(TimelineEvent.objects.count(), 1)
+
+    def test_failed_flush_keeps_events_for_retry(self):
+        buffer = TimelineBuffer(max_size=100, max_age=60)
+        buffer.add(self.event())
+        with mock.patch.object(TimelineEvent.objects, 'bulk_create', side_effect=RuntimeError), \
+                self.assertLogs('project_app.timeline', 'WARNING'):
+            self.assertEqual(buffer.flush(), [])
+        self.assertEqual(len(buffer), 1)
+        buffer.flush()
+        self.assertEqual(TimelineEvent.objects.count(), 1)
+
+    def test_bad_event_does_not_block_the_batch(self):
+        buffer = TimelineBuffer(max_size=100, max_age=60, max_attempts=2)
+        buffer.add(self.event())
+        buffer.add(TimelineEvent(project=self.project, event_type=None, user=self.user))
+        buffer.add(self.event())
+        with self.assertLogs('project_app.timeline', 'WARNING'):
+            self.assertEqual(len(buffer.flush()), 2)
+        self.assertEqual(TimelineEvent.objects.count(), 2)
+        self.assertEqual(len(buffer), 1)
+
+        # the bad event is dropped once it used up its attempts
+        with self.assertLogs('project_app.timeline', 'ERROR'):
+            buffer.flush()
+        self.assertEqual(len(buffer), 0)
+
+    def test_failed_retries_are_capped(self):
+        buffer = TimelineBuffer(max_size=100, max_age=60, max_pending=2)
+        for _ in range(3):
+            buffer.add(TimelineEvent(project=self.project, event_type=None, user=self.user))
+        with self.assertLogs('project_app.timeline', 'ERROR'):
+            buffer.flush()
+        self.assertEqual(len(buffer), 2)
+        buffer.discard()
+
+    def test_durable_flush_raises_on_failed_events(self):
+        buffer = TimelineBuffer(max_size=100, max_age=60, max_attempts=1)
+        buffer.add(TimelineEvent(project=self.project, event_type=None, user=self.user))
+        buffer.add(self.event())
+        with self.assertLogs('project_app.timeline'), self.assertRaises(TimelineFlushError):
+            buffer.flush(raise_on_failure=True)
+        self.assertEqual(TimelineEvent.objects.count(), 1)
+        self.assertEqual(len(buffer), 0)
+
+    def test_crash_loses_only_pending_events(self):
+        buffer = TimelineBuffer(max_size=2, max_age=60)
+        for _ in range(3):
+            buffer.add(self.event())
+        # the process dies: whatever was not flushed is gone
+        self.assertEqual(len(buffer.discard()), 1)
+        self.assertEqual(TimelineEvent.objects.count(), 2)
+
+    def test_request_end_flushes_buffer(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post('/api/projects/', {'name': 'New', 'start_date': '2025-01-01'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(timeline_buffer), 0)
+        self.assertTrue(TimelineEvent.objects.filter(event_type='project_created').exists())
+
+    def test_durable_mode_flushes_before_response(self):
+        def view(request):
+            record_event(self.project, 'task_created', self.user)
+            return HttpResponse()
+
+        middleware = TimelineBufferMiddleware(view)
+        with override_settings(TIMELINE_BUFFER_DURABLE=False):
+            middleware(RequestFactory().get('/'))
+            self.assertEqual(len(timeline_buffer), 1)
+        timeline_buffer.discard()
+
+        with override_settings(TIMELINE_BUFFER_DURABLE=True):
+            middleware(RequestFactory().get('/'))
+            self.assertEqual(len(timeline_buffer), 0)
+        self.assertEqual(TimelineEvent.objects.count(), 1)
+
+
+class ProjectMembersTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='password123')
+        self.users = [User.objects.create_user(username=f'user{i}', password='password123') for i in range(4)]
+        self.project = Project.objects.create(name='Project', created_by=self.owner)
+        self.project.members.add(self.users[0], self.users[1])
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.url = f'/api/projects/{self.project.pk}/members/'
+
+    def member_ids(self):
+        return set(self.project.members.values_list('id', flat=True))
+
+    def test_add_members(self):
+        ids = [self.users[1].pk, self.users[2].pk]
+        response = self.client.post(self.url, {'user_ids': ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['added'], 1)
+        self.assertEqual(self.member_ids(), {u.pk for u in self.users[:3]})
+        self.assertEqual(Notification.objects.filter(user=self.users[2]).count(), 1)
+
+    def test_remove_members(self):
+        response = self.client.delete(self.url, {'user_ids': [self.users[0].pk, self.users[3].pk]}, format='json')
+        self.assertEqual(response.data['removed'], 1)
+        self.assertEqual(self.member_ids(), {self.users[1].pk})
+
+    def test_replace_members_applies_diff(self):
+        ids = [self.users[1].pk, self.users[2].pk, self.users[3].pk]
+        response = self.client.put(self.url, {'user_ids': ids}, format='json')
+        self.assertEqual((response.data['added'], response.data['removed']), (2, 1))
+        self.assertEqual(self.member_ids(), set(ids))
+        self.assertEqual(Notification.objects.count(), 3)
+
+    def test_member_changes_bump_project_updated_at(self):
+        Project.objects.filter(pk=self.project.pk).update(updated_at=timezone.now() - timedelta(days=1))
+        before = Project.objects.get(pk=self.project.pk).updated_at
+        self.client.post(self.url, {'user_ids': [self.users[2].pk]}, format='json')
+        after = Project.objects.get(pk=self.project.pk).updated_at
+        self.assertGreater(after, before)
+
+        # a request that changes nothing leaves the project alone
+        self.client.post(self.url, {'user_ids': [self.users[2].pk]}, format='json')
+        self.assertEqual(Project.objects.get(pk=self.project.pk).updated_at, after)
+
+    def test_unknown_ids_are_rejected_before_any_change(self):
+        response = self.client.post(self.url, {'user_ids': [self.users[2].pk, 999999]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.member_ids(), {self.users[0].pk, self.users[1].pk})
+
+    def test_list_embeds_member_summary(self):
+        with self.settings(PROJECT_MEMBERS_PREVIEW_SIZE=1):
+            response = self.client.get('/api/projects/')
+        project = response.data['results'][0]
+        self.assertNotIn('members', project)
+        self.assertEqual(project['members_count'], 2)
+        self.assertEqual([m['id'] for m in project['members_preview']], [self.users[0].pk])
+
+    def test_expand_members(self):
+        response = self.client.get(f'/api/projects/{self.project.pk}/?expand=members')
+        self.assertEqual(len(response.data['members']), 2)
+
+    def test_list_queries_do_not_grow_with_projects(self):
+        self.client.get('/api/projects/')
+        for i in range(5):
+            project = Project.objects.create(name=f'Project {i}', created_by=self.owner)
+            project.members.add(*self.users)
+        with self.assertNumQueries(3):
+            # count, page and the member preview prefetch
+            self.client.get('/api/projects/')
+
+    def test_paginated_members_endpoint(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_serializer_validates_member_ids(self):
+        response = self.client.patch(f'/api/projects/{self.project.pk}/', {'member_ids': [999999]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('member_ids', response.data)
+
+
+class SparseFieldsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='password123')
+        self.project = Project.objects.create(name='Project', created_by=self.user)
+        for i in range(3):
+            Task.objects.create(title=f'Task {i}', project=self.project, created_by=self.user, assigned_to=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_fields_limits_response_and_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/tasks/?fields=id,title,status')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title', 'status'})
+        page_query = queries.captured_queries[-1]['sql']
+        self.assertNotIn('auth_user', page_query)
+        self.assertNotIn('project_app_comment', page_query)
+        self.assertNotIn('"description"', page_query)
+
+    def test_full_representation_uses_joins_and_annotations(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/tasks/')
+        task = response.data['results'][0]
+        self.assertEqual(task['assigned_to']['username'], 'alice')
+        self.assertEqual(task['project_name'], 'Project')
+        self.assertEqual(task['comments_count'], 0)
+
+    def test_omit(self):
+        response = self.client.get('/api/tasks/?omit=assigned_to,created_by,description')
+        self.assertNotIn('assigned_to', response.data['results'][0])
+        self.assertIn('title', response.data['results'][0])
+
+    def test_fields_on_write_keeps_validation(self):
+        response = self.client.post(
+            '/api/tasks/?fields=id', {'title': 'New', 'project': self.project.pk}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(set(response.data), {'id'})
+        response = self.client.post('/api/tasks/?fields=id', {'project': self.project.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class RenderingTests(TestCase):
+    def test_fast_json_matches_stdlib_renderer(self):
+        data = {'name': 'caf\u00e9 \u2028', 'count': 3, 'when': timezone.now(), 'items': [1, None]}
+        fast = FastJSONRenderer().render(data)
+        self.assertEqual(json.loads(fast), json.loads(JSONRenderer().render(data)))
+        self.assertIn(b'\\u2028', fast)
+
+    def compress(self, body, accept='gzip, br'):
+        middleware = CompressionMiddleware(lambda request: HttpResponse(body))
+        return middleware(RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept))
+
+    def test_large_responses_are_compressed(self):
+        body = b'{"title": "task"}' * 200
+        response = self.compress(body, accept='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), body)
+        self.assertIn('Accept-Encoding', response['Vary'])
+        # Django's random-length filename padding against BREACH
+        self.assertTrue(response.content[3] & gzip.FNAME)
+
+    @mock.patch('project_app.middleware.brotli')
+    def test_brotli_is_skipped_for_cookie_requests(self, brotli):
+        brotli.compress.return_value = b'br'
+        body = b'{"title": "task"}' * 200
+        middleware = CompressionMiddleware(lambda request: HttpResponse(body))
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='br, gzip')
+        self.assertEqual(middleware(request)['Content-Encoding'], 'br')
+
+        request.COOKIES['sessionid'] = 'secret'
+        self.assertEqual(middleware(request)['Content-Encoding'], 'gzip')
+
+    def test_small_or_unaccepted_responses_are_not_compressed(self):
+        with self.settings(RESPONSE_COMPRESSION_MIN_SIZE=1024):
+            self.assertFalse(self.compress(b'{}').has_header('Content-Encoding'))
+        body = b'{"title": "task"}' * 200
+        self.assertFalse(self.compress(body, accept='gzip;q=0').has_header('Content-Encoding'))
+
+
+@override_settings(SYNC_LAG_SECONDS=0)
+class SyncTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='password123')
+        self.other = User.objects.create_user(username='bob')
+        self.project = Project.objects.create(name='Mine', created_by=self.user)
+        self.shared = Project.objects.create(name='Shared', created_by=self.other)
+        self.shared.members.add(self.user)
+        Project.objects.create(name='Hidden', created_by=self.other)
+        self.task = Task.objects.create(title='Task', project=self.project, created_by=self.user)
+        self.comment = Comment.objects.create(content='Hi', author=self.user, task=self.task)
+        Notification.objects.create(user=self.user, title='t', message='m')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def sync(self, token=None):
+        response = self.client.get('/api/sync/', {'since': token} if token else {})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_initial_sync_returns_accessible_rows(self):
+        data = self.sync()
+        self.assertEqual({p['name'] for p in data['changes']['projects']}, {'Mine', 'Shared'})
+        self.assertEqual(len(data['changes']['tasks']), 1)
+        self.assertEqual(len(data['changes']['comments']), 1)
+        self.assertEqual(len(data['changes']['notifications']), 1)
+        self.assertFalse(data['has_more'])
+
+    def test_incremental_sync_returns_only_changes(self):
+        token = self.sync()['token']
+        data = self.sync(token)
+        self.assertTrue(all(not rows for rows in data['changes'].values()))
+
+        self.task.title = 'Renamed'
+        self.task.save()
+        comment_id = self.comment.pk
+        self.comment.delete()
+        data = self.sync(data['token'])
+        self.assertEqual([t['title'] for t in data['changes']['tasks']], ['Renamed'])
+        self.assertEqual(data['changes']['projects'], [])
+        self.assertEqual(data['deleted']['comments'], [comment_id])
+
+    def test_deleted_task_reports_its_comments(self):
+        token = self.sync()['token']
+        task_id, comment_id = self.task.pk, self.comment.pk
+        self.task.delete()
+        data = self.sync(token)
+        self.assertEqual(data['deleted']['tasks'], [task_id])
+        self.assertEqual(data['deleted']['comments'], [comment_id])
+
+    def test_project_cascade_writes_one_tombstone(self):
+        for i in range(3):
+            task = Task.objects.create(title=f'Task {i}', project=self.project, created_by=self.user)
+            Comment.objects.create(content='Hi', author=self.user, task=task)
+        self.project.delete()
+        self.assertEqual(list(Tombstone.objects.values_list('model', flat=True)), ['projects'])
+
+    def test_access_changes(self):
+        token = self.sync()['token']
+        self.shared.members.remove(self.user)
+        joined = Project.objects.create(name='Joined', created_by=self.other)
+        joined.members.add(self.user)
+        Task.objects.create(title='Old task', project=joined, created_by=self.other)
+
+        data = self.sync(token)
+        self.assertEqual(data['deleted']['projects'], [self.shared.pk])
+        self.assertEqual([p['name'] for p in data['changes']['projects']], ['Joined'])
+        self.assertEqual([t['title'] for t in data['changes']['tasks']], ['Old task'])
+
+    def test_pages_until_done(self):
+        for i in range(4):
+            Task.objects.create(title=f'Task {i}', project=self.project, created_by=self.user)
+        titles, token = [], None
+        with self.settings(SYNC_PAGE_SIZE=2):
+            for _ in range(5):
+                data = self.sync(token)
+                titles += [t['title'] for t in data['changes']['tasks']]
+                token = data['token']
+                if not data['has_more']:
+                    break
+        self.assertFalse(data['has_more'])
+        self.assertEqual(len(titles), 5)
+
+    def test_deletes_during_backfill_are_reported(self):
+        Task.objects.create(title='Second', project=self.project, created_by=self.user)
+        with self.settings(SYNC_PAGE_SIZE=1):
+            data = self.sync()
+            first = data['changes']['tasks'][0]['id']
+            Task.objects.get(pk=first).delete()
+            sent, deleted = {first}, set()
+            for _ in range(10):
+                data = self.sync(data['token'])
+                sent.update(t['id'] for t in data['changes']['tasks'])
+                deleted.update(data['deleted']['tasks'])
+                if not data['has_more']:
+                    break
+        self.assertFalse(data['has_more'])
+        self.assertEqual(len(sent), 2)
+        self.assertEqual(deleted, {first})
+
+    def test_invalid_token(self):
+        response = self.client.get('/api/sync/', {'since': 'garbage'})
+        self.assertEqual(response.status_code, 400)
+
+
+class BenchmarkTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        override = override_settings(MEDIA_ROOT=media_root.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_query_counts_do_not_grow_with_data(self):
+        owner = bench_data.generate(users=4, projects=2, members=3, tasks=3, comments=1, events=3, documents=1)
+        small = micro.bench_endpoints(owner, repeat=1)
+        bench_data.generate(users=4, projects=6, members=4, tasks=12, comments=2, events=12, documents=3)
+        Project.objects.update(created_by=owner)
+        large = micro.bench_endpoints(owner, repeat=1)
+
+        for name, metrics in small.items():
+            self.assertEqual(metrics['status'], 200, name)
+            self.assertEqual(large[name]['queries'], metrics['queries'], name)
+            # every case measures real rows, including /api/sync/ despite its lag
+            self.assertGreater(metrics['rows'], 0, name)
+
+    def test_serializer_benchmarks_cover_rows(self):
+        owner = bench_data.generate(users=2, projects=1, members=2, tasks=2, comments=1, events=2, documents=2)
+        for name, metrics in micro.bench_serializers(owner, repeat=1).items():
+            self.assertGreater(metrics['rows'], 0, name)
+
+    def test_compare_reports_regressions(self):
+        expected = {'view /api/tasks/': {'queries': 3, 'bytes': 100, 'latency_ms': 10.0}}
+        current = {'view /api/tasks/': {'queries': 4, 'bytes': 105, 'latency_ms': 30.0}}
+        self.assertEqual(len(baseline.compare(current, expected)), 1)
+        self.assertEqual(len(baseline.compare(current, expected, latency_tolerance=0.5)), 2)
+
+    def test_compare_reports_failing_or_missing_endpoints(self):
+        expected = {
+            'view /x': {'status': 200, 'rows': 20, 'queries': 5, 'bytes': 1000},
+            'view /y': {'status': 200, 'rows': 5, 'queries': 2, 'bytes': 300},
+        }
+        current = {'view /x': {'status': 500, 'rows': 0, 'queries': 1, 'bytes': 100}}
+        self.assertEqual(baseline.compare(current, expected), [
+            'view /x: status 500 != 200',
+            'view /x: rows 0 != 20',
+            'view /y: missing from the results',
+        ])
+        self.assertEqual(baseline.compare(expected, expected), [])
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        registry.clear()
+        self.user = User.objects.create_user(username='alice', password='password123')
+        Project.objects.create(name='Project', created_by=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_server_timing_header(self):
+        response = self.client.get('/api/projects/')
+        self.assertRegex(response['Server-Timing'], r'^total;dur=[\d.]+$')
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get('/api/projects/')
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="\d+ queries", serialize;dur=')
+
+        with self.settings(METRICS_TOKEN='secret'):
+            response = APIClient().get('/api/_metrics', HTTP_X_METRICS_TOKEN='secret')
+        self.assertIn('queries', response['Server-Timing'])
+
+    def test_slow_requests_are_logged_with_sql(self):
+        with self.settings(SLOW_REQUEST_SAMPLE_RATE=1.0, SLOW_REQUEST_MS=0):
+            with self.assertLogs('project_app.slow_requests', level='WARNING') as logs:
+                self.client.get('/api/projects/')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['route'], 'api/projects/')
+        self.assertTrue(any('project_app_project' in q['sql'] for q in record['sql']))
+
+    def test_metrics_endpoint(self):
+        self.client.get('/api/projects/')
+        self.assertEqual(self.client.get('/api/_metrics').status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get('/api/_metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'api_request_queries_count{method="GET",route="api/projects/",status="2xx"} 1',
+            response.content.decode()
+        )
+
+    def test_metrics_token(self):
+        with self.settings(METRICS_TOKEN='secret'):
+            response = APIClient().get('/api/_metrics', HTTP_X_METRICS_TOKEN='secret')
+            self.assertEqual(response.status_code, 200)
+            response = APIClient().get('/api/_metrics', HTTP_X_METRICS_TOKEN='wrong')
+            self.assertIn(response.status_code, (401, 403))
+
+
+class TaskDependencyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username='owner')
+        self.project = Project.objects.create(name='Project', created_by=self.owner)
+        start = timezone.now().date()
+        self.tasks = [
+            Task.objects.create(title=f'Task {i}', project=self.project, created_by=self.owner,
+                                due_date=start + timedelta(days=due))
+            for i, due in enumerate([1, 3, 10, 2])
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def depend(self, blocked, blocker):
+        return self.client.post(f'/api/tasks/{self.tasks[blocked].pk}/dependencies/',
+                                {'blocked_by': self.tasks[blocker].pk}, format='json')
+
+    def test_add_and_list_dependencies(self):
+        self.assertEqual(self.depend(1, 0).status_code, 201)
+        response = self.client.get(f'/api/tasks/{self.tasks[0].pk}/dependencies/')
+        self.assertEqual([t['id'] for t in response.data['blocks']], [self.tasks[1].pk])
+        self.assertEqual(response.data['blocked_by'], [])
+
+    def test_cycle_is_rejected(self):
+        self.depend(1, 0)
+        self.depend(2, 1)
+        response = self.depend(0, 2)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cycle', response.data['error'])
+        self.assertEqual(self.depend(0, 0).status_code, 400)
+        self.assertEqual(TaskDependency.objects.count(), 2)
+
+    def test_blocked_tasks_follow_blocker_status(self):
+        self.depend(1, 0)
+        url = f'/api/projects/{self.project.pk}/tasks/blocked/'
+        response = self.client.get(url)
+        self.assertEqual([(t['id'], t['blocked_by']) for t in response.data],
+                         [(self.tasks[1].pk, [self.tasks[0].pk])])
+
+        self.tasks[0].status = 'done'
+        self.tasks[0].save()
+        self.assertEqual(self.client.get(url).data, [])
+
+    def test_order_and_critical_path(self):
+        self.depend(1, 0)
+        self.depend(2, 1)
+        self.depend(2, 3)
+        response = self.client.get(f'/api/projects/{self.project.pk}/tasks/order/')
+        order = [t['id'] for t in response.data]
+        self.assertEqual(order, [self.tasks[i].pk for i in (0, 3, 1, 2)])
+
+        response = self.client.get(f'/api/projects/{self.project.pk}/tasks/critical-path/')
+        self.assertEqual(response.data['days'], 9)
+        self.assertEqual([t['id'] for t in response.data['tasks']], [self.tasks[i].pk for i in (0, 1, 2)])
+
+    def test_cycle_check_ignores_stale_cache(self):
+        self.depend(1, 0)
+        self.client.get(f'/api/projects/{self.project.pk}/tasks/order/')
+        # an edge the cached graph has not seen, as if written by another worker
+        TaskDependency.objects.bulk_create([
+            TaskDependency(project=self.project, blocker=self.tasks[1], blocked=self.tasks[2])
+        ])
+        self.assertEqual(self.depend(0, 2).status_code, 400)
+
+    def test_moving_a_task_updates_both_graphs(self):
+        other = Project.objects.create(name='Other', created_by=self.owner)
+        self.depend(1, 0)
+        blocked_url = f'/api/projects/{self.project.pk}/tasks/blocked/'
+        order_url = f'/api/projects/{self.project.pk}/tasks/order/'
+        self.client.get(order_url)
+
+        response = self.client.patch(f'/api/tasks/{self.tasks[1].pk}/', {'project': other.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('project', response.data)
+
+        response = self.client.patch(f'/api/tasks/{self.tasks[3].pk}/', {'project': other.pk}, format='json')
+        self.assertEqual(response.status_code, 200)
+        order = [t['id'] for t in self.client.get(order_url).data]
+        self.assertNotIn(self.tasks[3].pk, order)
+        self.assertEqual([t['id'] for t in self.client.get(f'/api/projects/{other.pk}/tasks/order/').data],
+                         [self.tasks[3].pk])
+
+        # a task moved by another writer leaves its edge behind; reads skip it
+        Task.objects.filter(pk=self.tasks[0].pk).update(project=other)
+        cache.clear()
+        self.assertEqual(self.client.get(blocked_url).data, [])
+        self.assertEqual(self.client.get(order_url).status_code, 200)
+
+    def test_process_local_graph_cache_is_flagged(self):
+        with self.settings(DEBUG=False):
+            self.assertEqual([w.id for w in checks.check_task_graph_cache(None)], ['project_app.W002'])
+            with self.settings(TASK_GRAPH_CACHE_SECONDS=0):
+                self.assertEqual(checks.check_task_graph_cache(None), [])
+
+    def test_graph_is_cached_until_changed(self):
+        self.depend(1, 0)
+        url = f'/api/projects/{self.project.pk}/tasks/order/'
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as cached:
+            self.client.get(url)
+        self.tasks[3].title = 'Renamed'
+        self.tasks[3].save()
+        with CaptureQueriesContext(connection) as reloaded:
+            response = self.client.get(url)
+        self.assertEqual(len(reloaded), len(cached) + 2)
+        self.assertIn('Renamed', [t['title'] for t in response.data])
+
+        self.client.delete(f'/api/tasks/{self.tasks[1].pk}/dependencies/',
+                           {'blocked_by': self.tasks[0].pk}, format='json')
+        self.assertFalse(TaskDependency.objects.exists())
+        self.assertEqual(self.client.get(f'/api/projects/{self.project.pk}/tasks/blocked/').data, [])
+
+
+class RecurringTaskTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner')
+        self.projects = [Project.objects.create(name=f'Project {i}', created_by=self.owner) for i in range(3)]
+        # a Sunday
+        self.now = timezone.make_aware(datetime(2026, 10, 18, 12, 0))
+        self.template = RecurringTaskTemplate.objects.create(
+            title='Maintenance', schedule='0 9 * * mon', due_offset_days=2,
+            starts_at=self.now - timedelta(days=60), created_by=self.owner
+        )
+        self.template.projects.set(self.projects)
+
+    def test_cron_schedule(self):
+        schedule = recurrence.parse_schedule('30 8 1,15 * *')
+        start = timezone.make_aware(datetime(2026, 1, 1))
+        occurrences = list(schedule.between(start, start + timedelta(days=31)))
+        self.assertEqual([o.day for o in occurrences], [1, 15])
+        self.assertEqual(len(list(recurrence.parse_schedule('@hourly').between(start, start + timedelta(days=1)))), 24)
+        with self.assertRaises(recurrence.InvalidSchedule):
+            recurrence.parse_schedule('61 * * * *')
+
+    @skipUnless(recurrence.rrulestr, "RRULE schedules need python-dateutil")
+    def test_rrule_schedule(self):
+        start = timezone.make_aware(datetime(2026, 1, 1))
+        schedule = recurrence.parse_schedule('RRULE:FREQ=WEEKLY;BYDAY=MO;BYHOUR=9;BYMINUTE=0;BYSECOND=0', start)
+        occurrences = list(schedule.between(start, start + timedelta(days=14)))
+        self.assertEqual([(o.day, o.hour) for o in occurrences], [(5, 9), (12, 9)])
+        schedule = recurrence.parse_schedule('DTSTART:20260101T090000Z\nRRULE:FREQ=DAILY')
+        self.assertEqual(len(list(schedule.between(start, start + timedelta(days=3)))), 3)
+        # a naive DTSTART cannot be compared with the aware window
+        with self.assertRaises(recurrence.InvalidSchedule):
+            recurrence.parse_schedule('DTSTART:20260101T090000\nRRULE:FREQ=WEEKLY')
+
+    def test_broken_schedule_does_not_stop_the_run(self):
+        broken = RecurringTaskTemplate.objects.create(
+            title='Broken', schedule='0 10 * * mon', starts_at=self.template.starts_at, created_by=self.owner
+        )
+        broken.projects.set(self.projects)
+        parse_schedule = recurrence.parse_schedule
+
+        def parse(expression, dtstart=None):
+            if expression == broken.schedule:
+                raise TypeError("can't compare offset-naive and offset-aware datetimes")
+            return parse_schedule(expression, dtstart)
+
+        with mock.patch.object(recurrence, 'parse_schedule', parse), \
+                self.assertLogs('project_app.recurrence', 'ERROR'):
+            results = recurrence.materialize(now=self.now, horizon_days=7, catchup_days=1)
+        self.assertEqual(results, {self.template.pk: 3})
+
+    def test_materialize_is_idempotent(self):
+        self.template.generated_until = self.now
+        self.template.save()
+        recurrence.materialize(now=self.now, horizon_days=7)
+        tasks = Task.objects.filter(recurrence_key__isnull=False)
+        self.assertEqual(tasks.count(), 3)
+        self.assertEqual({t.due_date.isoformat() for t in tasks}, {'2026-10-21'})
+
+        # a rerun or an overlapping window never duplicates tasks
+        RecurringTaskTemplate.objects.filter(pk=self.template.pk).update(generated_until=self.now)
+        recurrence.materialize(now=self.now, horizon_days=7)
+        recurrence.materialize(now=self.now, horizon_days=7)
+        self.assertEqual(tasks.count(), 3)
+
+    def test_missed_windows_are_caught_up(self):
+        self.template.generated_until = self.now - timedelta(days=14)
+        self.template.save()
+        results = recurrence.materialize(now=self.now, horizon_days=7, catchup_days=10)
+        # Mondays 12 Oct (5 Oct is beyond the catch-up window) and 19 Oct
+        self.assertEqual(results, {self.template.pk: 6})
+        self.assertEqual(Task.objects.filter(due_date='2026-10-14').count(), 3)
+        self.template.refresh_from_db()
+        self.assertEqual(self.template.generated_until, self.now + timedelta(days=7))
+
+    def test_api_validates_schedule_and_projects(self):
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        other = Project.objects.create(name='Other', created_by=User.objects.create_user(username='other'))
+        payload = {'title': 'Weekly', 'schedule': 'every monday', 'projects': [self.projects[0].pk]}
+        response = client.post('/api/recurring-tasks/', payload, format='json')
+        self.assertIn('schedule', response.data)
+        payload.update(schedule='0 9 * * 1', projects=[other.pk])
+        response = client.post('/api/recurring-tasks/', payload, format='json')
+        self.assertIn('projects', response.data)
+        payload['projects'] = [self.projects[0].pk]
+        response = client.post('/api/recurring-tasks/', payload, format='json')
+        self.assertEqual(response.status_code, 201)
+
+
+class ReminderTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner')
+        self.users = [User.objects.create_user(username=f'user{i}') for i in range(2)]
+        self.project = Project.objects.create(name='Project', created_by=self.owner)
+        self.now = timezone.make_aware(datetime(2026, 10, 18, 8, 0))
+        self.today = self.now.date()
+
+    def task(self, user, days, status='todo'):
+        return Task.objects.create(title=f'Task {days}', project=self.project, created_by=self.owner,
+                                   assigned_to=user, status=status, due_date=self.today + timedelta(days=days))
+
+    def test_one_digest_per_user(self):
+        self.task(self.users[0], -1)
+        self.task(self.users[0], 1)
+        self.task(self.users[0], 10)
+        self.task(self.users[0], 0, status='done')
+        self.task(self.users[1], 2)
+        self.task(None, 1)
+
+        # stale state reset, the assignee ids, then one batch (tasks, then
+        # states, digests and new states in a savepoint)
+        with self.assertNumQueries(8):
+            sent = reminders.send_digests(now=self.now, soon_days=2, overdue_days=7)
+        self.assertEqual(sent, 2)
+        digest = Notification.objects.get(user=self.users[0])
+        self.assertEqual(digest.title, 'Task digest: 1 overdue, 1 due soon')
+        self.assertIn('Task -1 (Project), due 2026-10-17 (1 day ago)', digest.message)
+        self.assertNotIn('Task 10', digest.message)
+
+    def test_reminders_are_not_repeated(self):
+        self.task(self.users[0], 1)
+        reminders.send_digests(now=self.now, soon_days=2, overdue_days=7)
+        self.assertEqual(reminders.send_digests(now=self.now, soon_days=2, overdue_days=7), 0)
+
+        # the same task is reported once more when it becomes overdue
+        later = self.now + timedelta(days=2)
+        self.assertEqual(reminders.send_digests(now=later, soon_days=2, overdue_days=7), 1)
+        self.assertEqual(reminders.send_digests(now=later, soon_days=2, overdue_days=7), 0)
+        self.assertEqual(Notification.objects.filter(user=self.users[0]).count(), 2)
+
+    def test_beat_entries_have_cron_commands(self):
+        # each periodic job can also run from cron when celery is not installed
+        for entry in settings.CELERY_BEAT_SCHEDULE.values():
+            self.assertIn(entry['task'].rsplit('.', 1)[1], get_commands())
+
+    def test_batches_and_stale_state(self):
+        for user in self.users:
+            self.task(user, 1)
+        self.assertEqual(reminders.send_digests(now=self.now, soon_days=2, overdue_days=7, batch_size=1), 2)
+        self.assertEqual(ReminderState.objects.exclude(sent={}).count(), 2)
+
+        # once their tasks are done the users' state is emptied without touching the others
+        Task.objects.filter(assigned_to=self.users[0]).update(status='done')
+        self.assertEqual(reminders.send_digests(now=self.now, soon_days=2, overdue_days=7, batch_size=1), 0)
+        self.assertEqual(ReminderState.objects.get(user=self.users[0]).sent, {})
+        self.assertNotEqual(ReminderState.objects.get(user=self.users[1]).sent, {})
+
+
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password=None)
+        self.client.force_login(self.admin)
+        self.project = Project.objects.create(name='Project', created_by=self.admin)
+        self.other = Project.objects.create(name='Other', created_by=self.admin)
+
+    def add_tasks(self, project, count):
+        for i in range(count):
+            task = Task.objects.create(title=f'Task {i}', project=project, created_by=self.admin,
+                                       assigned_to=self.admin)
+            Comment.objects.create(content='Comment', author=self.admin, task=task, project=project)
+
+    def changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.add_tasks(self.project, 2)
+        small = [self.changelist_queries(f'/admin/project_app/{name}/') for name in ('task', 'comment')]
+        self.add_tasks(self.project, 10)
+        large = [self.changelist_queries(f'/admin/project_app/{name}/') for name in ('task', 'comment')]
+        self.assertEqual(small, large)
+
+    def test_project_id_filter(self):
+        self.add_tasks(self.project, 2)
+        self.add_tasks(self.other, 1)
+        response = self.client.get(f'/admin/project_app/task/?project_id={self.other.pk}')
+        self.assertEqual(response.context['cl'].result_count, 1)
+        self.assertContains(response, f'name="project_id" value="{self.other.pk}"')
+        # the sidebar no longer lists projects
+        self.assertNotContains(response, f'?project__id__exact={self.project.pk}')
+        response = self.client.get('/admin/project_app/task/?project_id=abc')
+        self.assertEqual(response.status_code, 302)
+
+    def test_estimated_count(self):
+        self.add_tasks(self.project, 2)
+        with mock.patch.object(project_admin, 'estimated_row_count', return_value=5000000), \
+                override_settings(ADMIN_EXACT_COUNT_LIMIT=1000):
+            response = self.client.get('/admin/project_app/task/')
+            self.assertEqual(response.context['cl'].result_count, 5000000)
+            response = self.client.get('/admin/project_app/task/?status__exact=todo')
+            self.assertEqual(response.context['cl'].result_count, 2)
+
+
+class FeedTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='user')
+        self.other = User.objects.create_user(username='other')
+        owned = Project.objects.create(name='Owned', created_by=self.user)
+        joined = Project.objects.create(name='Joined', created_by=self.other)
+        joined.members.add(self.user)
+        self.hidden = Project.objects.create(name='Hidden', created_by=self.other)
+        self.projects = [owned, joined]
+        now = timezone.now()
+        for i in range(6):
+            for project in (owned, joined, self.hidden):
+                event = TimelineEvent.objects.create(project=project, event_type='task_created', user=self.other)
+                TimelineEvent.objects.filter(pk=event.pk).update(created_at=now - timedelta(minutes=10 - i))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def read_all(self, page_size=5):
+        url, seen = f'/api/feed/?page_size={page_size}', []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(event['id'] for event in response.data['results'])
+            url = response.data['next']
+        return seen
+
+    def expected(self):
+        return list(TimelineEvent.objects.filter(project__in=self.projects)
+                    .order_by('-created_at', '-pk').values_list('pk', flat=True))
+
+    def test_merges_accessible_projects(self):
+        self.assertEqual(self.read_all(), self.expected())
+        self.assertFalse(PrecomputedFeed.objects.exists())
+        response = self.client.get('/api/feed/?cursor=bogus')
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(FEED_PRECOMPUTE_MIN_PROJECTS=2, FEED_PRECOMPUTE_BACKFILL=4)
+    def test_precomputed_feed(self):
+        # the backfill covers the first page, older pages fall back to the timeline
+        self.assertEqual(self.read_all(page_size=3), self.expected())
+        self.assertEqual(FeedEntry.objects.filter(user=self.user).count(), 4)
+
+        # new events are fanned out on write
+        record_event(self.projects[1], 'comment_added', self.other)
+        timeline_buffer.flush()
+        self.assertEqual(FeedEntry.objects.filter(user=self.user).count(), 5)
+        self.assertFalse(FeedEntry.objects.filter(user=self.other).exists())
+        self.assertEqual(self.read_all(page_size=3), self.expected())
+
+        # losing access drops the project's entries
+        joined = self.projects.pop()
+        joined.members.remove(self.user)
+        self.assertEqual(self.read_all(page_size=3), self.expected())
+        self.assertFalse(FeedEntry.objects.filter(user=self.user, project_id=joined.pk).exists())
+
+    @override_settings(FEED_PRECOMPUTE_MIN_PROJECTS=2, FEED_PRECOMPUTE_BACKFILL=4)
+    def test_capped_backfill_of_a_new_project_is_not_skipped(self):
+        self.read_all(page_size=3)
+        # older entries of the current projects exist below the new project's backfill
+        FeedEntry.objects.bulk_create([
+            FeedEntry(user=self.user, event_id=pk, project_id=project_id, created_at=created_at)
+            for pk, project_id, created_at in TimelineEvent.objects.filter(project__in=self.projects)
+            .values_list('pk', 'project_id', 'created_at')
+        ], ignore_conflicts=True)
+        self.hidden.members.add(self.user)
+        self.projects.append(self.hidden)
+        self.assertEqual(self.read_all(page_size=3), self.expected())
+
+    @override_settings(FEED_PRECOMPUTE_MIN_PROJECTS=2, FEED_PRECOMPUTE_BACKFILL=100)
+    def test_failed_fan_out_falls_back_to_timeline(self):
+        self.read_all()
+        self.assertIsNone(PrecomputedFeed.objects.get(user=self.user).complete_after)
+        record_event(self.projects[0], 'comment_added', self.other)
+        with mock.patch('project_app.feed.fan_out', side_effect=RuntimeError), \
+                self.assertLogs('project_app.feed', 'ERROR'):
+            timeline_buffer.flush()
+        record_event(self.projects[0], 'comment_added', self.other)
+        timeline_buffer.flush()
+
+        self.assertIsNotNone(PrecomputedFeed.objects.get(user=self.user).complete_after)
+        self.assertEqual(self.read_all(page_size=3), self.expected())
+
+
+class ProjectCloneTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner')
+        self.member = User.objects.create_user(username='member')
+        self.outsider = User.objects.create_user(username='outsider')
+        self.source = Project.objects.create(name='Template', created_by=self.owner,
+                                             start_date='2026-01-01', end_date='2026-03-01')
+        self.source.members.add(self.member)
+        self.tasks = [
+            Task.objects.create(title=f'Task {i}', project=self.source, created_by=self.owner, status='done',
+                                assigned_to=[self.member, self.outsider][i % 2], due_date=f'2026-01-1{i}')
+            for i in range(4)
+        ]
+        TaskDependency.objects.create(project=self.source, blocker=self.tasks[0], blocked=self.tasks[1])
+        Document.objects.create(name='Spec', project=self.source, uploaded_by=self.owner, file='documents/spec.pdf')
+        self.client = APIClient()
+        self.client.force_authenticate(self.member)
+
+    def tearDown(self):
+        timeline_buffer.discard()
+
+    def clone(self, **options):
+        return self.client.post(f'/api/projects/{self.source.pk}/clone/', options, format='json')
+
+    def test_clone_with_date_shift(self):
+        response = self.clone(start_date='2026-02-01', include_documents=True)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['copied'], {'members': 1, 'tasks': 4, 'dependencies': 1, 'documents': 1})
+        project = Project.objects.get(pk=response.data['project']['id'])
+        self.assertEqual(project.name, 'Copy of Template')
+        self.assertEqual(project.created_by, self.member)
+        self.assertEqual(set(project.members.all()), {self.owner})
+        self.assertEqual(str(project.end_date), '2026-04-01')
+
+        tasks = list(project.tasks.order_by('title'))
+        self.assertEqual([str(t.due_date) for t in tasks], ['2026-02-10', '2026-02-11', '2026-02-12', '2026-02-13'])
+        self.assertEqual({t.status for t in tasks}, {'todo'})
+        # the outsider is not part of the copy, so their tasks are unassigned
+        self.assertEqual([t.assigned_to_id for t in tasks], [self.member.pk, None, self.member.pk, None])
+        dependency = TaskDependency.objects.get(project=project)
+        self.assertEqual((dependency.blocker.title, dependency.blocked.title), ('Task 0', 'Task 1'))
+        self.assertEqual(project.documents.get().file.name, 'documents/spec.pdf')
+
+        timeline_buffer.flush()
+        self.assertEqual(TimelineEvent.objects.filter(project=project).count(), 1)
+
+    def test_clone_options(self):
+        response = self.clone(name='Client', reset_status=False, include_members=False)
+        project = Project.objects.get(pk=response.data['project']['id'])
+        self.assertEqual(project.name, 'Client')
+        self.assertFalse(project.members.exists())
+        self.assertFalse(project.documents.exists())
+        self.assertEqual({t.status for t in project.tasks.all()}, {'done'})
+        self.assertEqual(self.clone(start_date='2026-02-01', shift_days=3).status_code, 400)
+
+        self.client.force_authenticate(self.outsider)
+        self.assertEqual(self.clone().status_code, 404)
+
+    def test_clone_skips_edges_to_moved_tasks(self):
+        other = Project.objects.create(name='Other', created_by=self.owner)
+        Task.objects.filter(pk=self.tasks[1].pk).update(project=other)
+        response = self.clone()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['copied']['tasks'], 3)
+        self.assertEqual(response.data['copied']['dependencies'], 0)
+
+    def test_query_count_does_not_grow_with_tasks(self):
+        def queries():
+            with CaptureQueriesContext(connection) as captured:
+                cloning.clone_project(self.source, self.owner)
+            return len(captured)
+
+        small = queries()
+        Task.objects.bulk_create([
+            Task(title=f'Extra {i}', project=self.source, created_by=self.owner) for i in range(50)
+        ])
+        self.assertEqual(queries(), small)
+
+
+class TaskTransitionTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner')
+        self.member = User.objects.create_user(username='member')
+        self.project = Project.objects.create(name='Project', created_by=self.owner)
+        self.project.members.add(self.member)
+        self.task = Task.objects.create(title='Task', project=self.project, created_by=self.owner)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.url = f'/api/tasks/{self.task.pk}/transition/'
+
+    def tearDown(self):
+        timeline_buffer.discard()
+
+    def completed_events(self):
+        timeline_buffer.flush()
+        return TimelineEvent.objects.filter(project=self.project, event_type='task_completed').count()
+
+    def test_completion_is_recorded_once(self):
+        response = self.client.post(self.url, {'status': 'done', 'version': 1}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['changed'], ['status'])
+        self.assertEqual(response.data['task']['version'], 2)
+
+        response = self.client.post(self.url, {'status': 'done'}, format='json')
+        self.assertEqual(response.data['changed'], [])
+        self.assertEqual(response.data['task']['version'], 2)
+        self.assertEqual(self.completed_events(), 1)
+
+    def test_conflicts_return_409(self):
+        self.client.post(self.url, {'status': 'in_progress'}, format='json')
+        response = self.client.post(self.url, {'status': 'done', 'version': 1}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual((response.data['status'], response.data['version']), ('in_progress', 2))
+        response = self.client.post(self.url, {'status': 'done', 'from_status': 'review'}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.completed_events(), 0)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.status, 'in_progress')
+
+    def test_concurrent_write_between_read_and_update(self):
+        real_update = django_models.QuerySet.update
+
+        def update(queryset, **kwargs):
+            # another writer gets in first
+            real_update(Task.objects.filter(pk=self.task.pk), version=django_models.F('version') + 1)
+            return real_update(queryset, **kwargs)
+
+        with mock.patch.object(django_models.QuerySet, 'update', update):
+            response = self.client.post(self.url, {'status': 'done'}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.completed_events(), 0)
+
+    def test_assignment(self):
+        response = self.client.post(self.url, {'assigned_to': self.member.pk}, format='json')
+        self.assertEqual(response.data['changed'], ['assigned_to'])
+        self.assertEqual(Notification.objects.filter(user=self.member).count(), 1)
+        response = self.client.post(f'/api/tasks/{self.task.pk}/assign/', {'user_id': self.member.pk}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Notification.objects.filter(user=self.member).count(), 1)
+        response = self.client.post(self.url, {'assigned_to': None}, format='json')
+        self.assertIsNone(response.data['task']['assigned_to'])
+
+    def test_detail_update_writes_only_submitted_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(f'/api/tasks/{self.task.pk}/', {'title': 'Renamed'}, format='json')
+        self.assertEqual(response.data['version'], 2)
+        update = next(q['sql'] for q in queries if q['sql'].startswith('UPDATE "project_app_task"'))
+        self.assertNotIn('"status"', update)
+        self.assertIn('"title"', update)
+
+    def test_detail_update_checks_if_match(self):
+        url = f'/api/tasks/{self.task.pk}/'
+        response = self.client.patch(url, {'title': 'First'}, format='json', HTTP_IF_MATCH='"1"')
+        self.assertEqual((response.status_code, response.data['version']), (200, 2))
+
+        # a client still holding version 1 is turned away
+        response = self.client.patch(url, {'title': 'Stale'}, format='json', HTTP_IF_MATCH='"1"')
+        self.assertEqual((response.status_code, response.data['version']), (409, 2))
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.title, 'First')
+
+        response = self.client.patch(url, {'title': 'Stale'}, format='json', HTTP_IF_MATCH='latest')
+        self.assertEqual(response.status_code, 400)
+
+    def test_if_match_is_a_single_conditional_update(self):
+        url = f'/api/tasks/{self.task.pk}/'
+        with CaptureQueriesContext(connection) as captured:
+            self.client.patch(url, {'title': 'First'}, format='json', HTTP_IF_MATCH='"1"')
+        writes = [q['sql'] for q in captured if q['sql'].startswith('UPDATE "project_app_task"')]
+        self.assertEqual(len(writes), 1)
+        self.assertIn('"version" = 1', writes[0])
+        self.assertFalse([q for q in captured if 'FOR UPDATE' in q['sql']])
+
+    def test_save_bumps_version(self):
+        url = f'/api/tasks/{self.task.pk}/'
+        self.task.title = 'Edited in the admin'
+        self.task.save()
+        self.assertEqual(self.task.version, 2)
+        response = self.client.patch(url, {'title': 'Stale'}, format='json', HTTP_IF_MATCH='"1"')
+        self.assertEqual(response.status_code, 409)
+
+    def test_if_match_on_deleted_task_is_404(self):
+        url = f'/api/tasks/{self.task.pk}/'
+        update_if_version = transitions.update_if_version
+
+        def delete_first(task, *args):
+            Task.objects.filter(pk=task.pk).delete()
+            return update_if_version(task, *args)
+
+        with mock.patch('project_app.views.update_if_version', delete_first):
+            response = self.client.patch(url, {'title': 'Gone'}, format='json', HTTP_IF_MATCH='"1"')
+        self.assertEqual(response.status_code, 404)
+
+    def test_task_gone_after_transition_is_404(self):
+        real_transition = transitions.transition_task
+
+        def transition_task(queryset, task_id, *args, **kwargs):
+            changed = real_transition(queryset, task_id, *args, **kwargs)
+            Task.objects.filter(pk=task_id).delete()
+            return changed
+
+        with mock.patch('project_app.views.transition_task', transition_task):
+            response = self.client.post(self.url, {'status': 'done'}, format='json')
+        self.assertEqual(response.status_code, 404)
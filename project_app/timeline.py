@@ -0,0 +1,165 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from .feed import fan_out_safely
+from .models import TimelineEvent
+
+
+logger = logging.getLogger(__name__)
+
+
+class TimelineFlushError(Exception):
+    pass
+
+
+class TimelineBuffer:
+    """
+    Per-process write-behind buffer for timeline events. Events are written
+    with a single bulk_create once ``max_size`` events are pending, once the
+    oldest pending event is ``max_age`` seconds old, and at the end of every
+    request. Pending events are lost if the process dies before a flush;
+    set TIMELINE_BUFFER_DURABLE to flush before each response is returned.
+
+    When the batch insert fails the events are retried one by one, so a
+    single bad event (say, of a project deleted meanwhile) cannot hold back
+    the rest. Events still failing are kept for at most ``max_attempts``
+    flushes and ``max_pending`` events, then dropped and logged.
+    """
+
+    def __init__(self, max_size=None, max_age=None, max_attempts=None, max_pending=None):
+        self._max_size = max_size
+        self._max_age = max_age
+        self._max_attempts = max_attempts
+        self._max_pending = max_pending
+        self._events = []
+        self._oldest = None
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self):
+        if self._max_size is not None:
+            return self._max_size
+        return getattr(settings, 'TIMELINE_BUFFER_SIZE', 100)
+
+    @property
+    def max_age(self):
+        if self._max_age is not None:
+            return self._max_age
+        return getattr(settings, 'TIMELINE_BUFFER_MAX_AGE', 1.0)
+
+    @property
+    def max_attempts(self):
+        if self._max_attempts is not None:
+            return self._max_attempts
+        return getattr(settings, 'TIMELINE_BUFFER_MAX_ATTEMPTS', 3)
+
+    @property
+    def max_pending(self):
+        if self._max_pending is not None:
+            return self._max_pending
+        return getattr(settings, 'TIMELINE_BUFFER_MAX_PENDING', 10000)
+
+    def __len__(self):
+        return len(self._events)
+
+    def add(self, event):
+        with self._lock:
+            if not self._events:
+                self._oldest = time.monotonic()
+            self._events.append(event)
+            full = (
+                len(self._events) >= self.max_size or
+                time.monotonic() - self._oldest >= self.max_age
+            )
+        if full:
+            self.flush()
+        return event
+
+    def flush(self, raise_on_failure=False):
+        """
+        Write the pending events and return those that were saved. With
+        ``raise_on_failure`` a TimelineFlushError is raised after the saved
+        events are fanned out if any event of this flush could not be written.
+        """
+        with self._lock:
+            events, self._events = self._events, []
+            self._oldest = None
+        if not events:
+            return []
+        try:
+            with transaction.atomic():
+                created = TimelineEvent.objects.bulk_create(events)
+            failed = []
+        except Exception:
+            logger.warning("Bulk insert of %d timeline events failed, retrying one by one", len(events), exc_info=True)
+            created, failed = self._insert_each(events)
+            self._requeue(failed)
+        fan_out_safely(created)
+        if failed and raise_on_failure:
+            raise TimelineFlushError(f"{len(failed)} timeline events could not be written.")
+        return created
+
+    def _insert_each(self, events):
+        created, failed = [], []
+        for event in events:
+            try:
+                with transaction.atomic():
+                    created.extend(TimelineEvent.objects.bulk_create([event]))
+            except Exception:
+                event._flush_attempts = getattr(event, '_flush_attempts', 0) + 1
+                failed.append(event)
+        return created, failed
+
+    def _requeue(self, failed):
+        retry = []
+        for event in failed:
+            if event._flush_attempts < self.max_attempts:
+                retry.append(event)
+            else:
+                logger.error(
+                    "Dropping timeline event %r of project %s after %d failed writes",
+                    event.event_type, event.project_id, event._flush_attempts
+                )
+        if not retry:
+            return
+        with self._lock:
+            # keep the events ahead of anything added meanwhile so the next
+            # flush retries them in order
+            self._events[:0] = retry
+            overflow = len(self._events) - self.max_pending
+            if overflow > 0:
+                del self._events[:overflow]
+                logger.error("Timeline buffer is full, dropped the %d oldest events", overflow)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+
+    def discard(self):
+        with self._lock:
+            events, self._events = self._events, []
+            self._oldest = None
+        return events
+
+
+timeline_buffer = TimelineBuffer()
+
+
+def record_event(project, event_type, user, description=None):
+    """Queue a timeline event; it is written on the next buffer flush."""
+    return timeline_buffer.add(TimelineEvent(
+        project=project,
+        event_type=event_type,
+        user=user,
+        description=description
+    ))
+
+
+def flush_timeline_buffer(**kwargs):
+    timeline_buffer.flush()
+
+
+atexit.register(flush_timeline_buffer)
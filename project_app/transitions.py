@@ -0,0 +1,98 @@
+from django.db import models
+from django.utils import timezone
+
+from .dependencies import invalidate_graph
+from .models import Notification, Project, Task
+from .timeline import record_event
+
+
+class TransitionConflict(Exception):
+    def __init__(self, message, current):
+        super().__init__(message)
+        self.current = current
+
+
+CURRENT_FIELDS = ('id', 'title', 'project_id', 'project__name', 'status', 'assigned_to_id', 'version')
+
+
+def update_if_version(task, values, expected_version):
+    """
+    Write ``values`` (field name -> value) to ``task`` with one
+    ``UPDATE ... WHERE version = <expected_version>`` that also bumps the
+    version; no row lock is taken. Raises TransitionConflict when the task
+    has moved past ``expected_version`` and Task.DoesNotExist when it is
+    gone. ``task`` itself is not modified.
+    """
+    updated = Task.objects.filter(pk=task.pk, version=expected_version).update(
+        **values, version=models.F('version') + 1, updated_at=timezone.now()
+    )
+    if not updated:
+        current = Task.objects.filter(pk=task.pk).values(*CURRENT_FIELDS).first()
+        if current is None:
+            raise Task.DoesNotExist
+        raise TransitionConflict("Task was modified by someone else.", current)
+
+    # queryset updates skip the signals that refresh the cached task graphs
+    invalidate_graph(task.project_id)
+    project = values.get('project')
+    if project is not None and project.pk != task.project_id:
+        invalidate_graph(project.pk)
+
+
+def transition_task(queryset, task_id, user, changes, expected_version=None, expected_status=None):
+    """
+    Apply ``changes`` (``status`` and/or ``assigned_to``) to one task of
+    ``queryset`` as a single ``UPDATE ... WHERE version = <read version>``;
+    no row lock is taken and the rest of the row is left alone. A task that
+    changed since the caller's ``expected_version`` / ``expected_status``,
+    or between the read and the update, raises TransitionConflict.
+    Timeline events and notifications are only written for fields that
+    actually changed. Returns the names of the changed fields.
+    """
+    current = queryset.filter(pk=task_id).values(*CURRENT_FIELDS).first()
+    if current is None:
+        raise Task.DoesNotExist
+    if expected_version is not None and current['version'] != expected_version:
+        raise TransitionConflict("Task was modified by someone else.", current)
+    if expected_status is not None and current['status'] != expected_status:
+        raise TransitionConflict(f"Task is '{current['status']}', not '{expected_status}'.", current)
+
+    assignee = changes.get('assigned_to')
+    values = {'status': changes['status']} if 'status' in changes else {}
+    if 'assigned_to' in changes:
+        values['assigned_to_id'] = assignee.pk if assignee is not None else None
+    changed = {field: value for field, value in values.items() if current[field] != value}
+    if not changed:
+        return []
+
+    updated = Task.objects.filter(pk=task_id, version=current['version']).update(
+        **changed, version=models.F('version') + 1, updated_at=timezone.now()
+    )
+    if not updated:
+        current = Task.objects.filter(pk=task_id).values(*CURRENT_FIELDS).first() or current
+        raise TransitionConflict("Task was modified by someone else.", current)
+
+    # queryset updates skip the signals that refresh the cached task graph
+    invalidate_graph(current['project_id'])
+    project = Project(pk=current['project_id'], name=current['project__name'])
+    if changed.get('status') == 'done':
+        record_event(
+            project=project,
+            event_type='task_completed',
+            user=user,
+            description=f"Task '{current['title']}' completed."
+        )
+    if changed.get('assigned_to_id') is not None:
+        record_event(
+            project=project,
+            event_type='task_assigned',
+            user=user,
+            description=f"Task '{current['title']}' assigned to {assignee.username}."
+        )
+        Notification.objects.create(
+            user=assignee,
+            title=f"New Task Assigned: {current['title']}",
+            message=f"You have been assigned a new task: {current['title']} in project {project.name}.",
+            is_read=False
+        )
+    return ['assigned_to' if field == 'assigned_to_id' else field for field in changed]
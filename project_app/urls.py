@@ -12,11 +12,20 @@ urlpatterns = [
     # Projects
     path('projects/', views.ProjectListCreateView.as_view(), name='project-list-create'),
     path('projects/<int:pk>/', views.ProjectDetailView.as_view(), name='project-detail'),
+    path('projects/<int:pk>/members/', views.ProjectMembersView.as_view(), name='project-members'),
+    path('projects/<int:pk>/clone/', views.clone_project_view, name='project-clone'),
+    path('projects/<int:pk>/tasks/blocked/', views.blocked_tasks, name='project-blocked-tasks'),
+    path('projects/<int:pk>/tasks/order/', views.topological_order, name='project-task-order'),
+    path('projects/<int:pk>/tasks/critical-path/', views.critical_path, name='project-critical-path'),
     
     # Tasks
     path('tasks/', views.TaskListCreateView.as_view(), name='task-list-create'),
     path('tasks/<int:pk>/', views.TaskDetailView.as_view(), name='task-detail'),
     path('tasks/<int:task_id>/assign/', views.assign_task, name='assign-task'),
+    path('tasks/<int:task_id>/transition/', views.transition_task_view, name='task-transition'),
+    path('tasks/<int:task_id>/dependencies/', views.task_dependencies, name='task-dependencies'),
+    path('recurring-tasks/', views.RecurringTaskTemplateListCreateView.as_view(), name='recurring-task-list-create'),
+    path('recurring-tasks/<int:pk>/', views.RecurringTaskTemplateDetailView.as_view(), name='recurring-task-detail'),
     
     # Documents
     path('documents/', views.DocumentListCreateView.as_view(), name='document-list-create'),
@@ -28,8 +37,15 @@ urlpatterns = [
     
     # Timeline
     path('timeline/', views.TimelineEventListView.as_view(), name='timeline-events'),
+    path('feed/', views.feed_view, name='feed'),
     
     # Notifications
     path('notifications/', views.NotificationListView.as_view(), name='notification-list'),
     path('notifications/<int:notification_id>/mark_read/', views.mark_notification_read, name='mark-notification-read'),
+
+    # Sync
+    path('sync/', views.sync_view, name='sync'),
+
+    # Metrics
+    path('_metrics', views.metrics_view, name='metrics'),
 ]
\ No newline at end of file
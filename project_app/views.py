@@ -2,15 +2,29 @@ from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from .models import Project, Task, Document, Comment, TimelineEvent, Notification
+from .models import Project, Task, RecurringTaskTemplate, Document, Comment, TimelineEvent, Notification
+from .timeline import record_event
+from .membership import add_members, remove_members, replace_members
+from .sync import InvalidSyncToken, build_sync
+from .feed import InvalidFeedCursor, build_feed
+from .cloning import clone_project
+from .transitions import TransitionConflict, transition_task, update_if_version
+from .dependencies import DependencyError, add_dependency, get_graph
+from .instrumentation import registry
+from .permissions import HasMetricsAccess
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
 from django.shortcuts import get_object_or_404
+from django.http import HttpResponse
+from django.conf import settings
+from rest_framework.utils.urls import replace_query_param
 from django.db import models
 from .serializers import (
     TaskAssignSerializer, UserSerializer, UserRegisterSerializer, ProjectSerializer, TaskSerializer,
-    DocumentSerializer, CommentSerializer, TimelineEventSerializer, NotificationSerializer
+    DocumentSerializer, CommentSerializer, TimelineEventSerializer, NotificationSerializer,
+    ProjectMembersSerializer, TaskDependencySerializer, RecurringTaskTemplateSerializer, ProjectCloneSerializer,
+    TaskTransitionSerializer
 )
 
 
@@ -73,7 +87,19 @@ def logout_view(request):
     
 
 # Project Views
-class ProjectListCreateView(generics.ListCreateAPIView):
+class SparseFieldsMixin:
+    """Trim the queryset to the fields the serializer will render."""
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return self.get_serializer_class().prepare_queryset(queryset, self.request)
+
+
+def accessible_projects(user):
+    return Project.objects.filter(models.Q(created_by=user) | models.Q(members=user)).distinct()
+
+
+class ProjectListCreateView(SparseFieldsMixin, generics.ListCreateAPIView):
     serializer_class = ProjectSerializer
     permission_classes = [IsAuthenticated]
 
@@ -87,7 +113,7 @@ class ProjectListCreateView(generics.ListCreateAPIView):
         project = serializer.save(created_by=self.request.user)
 
         # create a timeline event for project creation
-        TimelineEvent.objects.create(
+        record_event(
             project=project,
             event_type='project_created',
             user=self.request.user,
@@ -95,7 +121,7 @@ class ProjectListCreateView(generics.ListCreateAPIView):
         )
 
 
-class ProjectDetailView(generics.RetrieveUpdateDestroyAPIView):
+class ProjectDetailView(SparseFieldsMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = ProjectSerializer
     permission_classes = [IsAuthenticated]
 
@@ -104,10 +130,80 @@ class ProjectDetailView(generics.RetrieveUpdateDestroyAPIView):
             models.Q(created_by=self.request.user) |
             models.Q(members=self.request.user)
         ).distinct()
+
+
+class ProjectMembersView(generics.GenericAPIView):
+    """
+    GET pages through the members of a project. POST adds, DELETE removes and
+    PUT replaces members given ``user_ids``; the diff is applied directly to
+    the membership table.
+    """
+    serializer_class = ProjectMembersSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return Project.objects.filter(
+            models.Q(created_by=self.request.user) |
+            models.Q(members=self.request.user)
+        ).distinct()
+
+    def apply(self, request, operation):
+        project = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        added, removed = operation(project, serializer.validated_data['user_ids'])
+        return Response({
+            "added": len(added),
+            "removed": len(removed),
+            "members_count": project.members.count(),
+        }, status=status.HTTP_200_OK)
+
+    def get(self, request, *args, **kwargs):
+        project = self.get_object()
+        queryset = User.objects.filter(projects=project).order_by('id')
+        queryset = UserSerializer.prepare_queryset(queryset, request)
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(UserSerializer(page, many=True, context={'request': request}).data)
+
+    def post(self, request, *args, **kwargs):
+        return self.apply(request, add_members)
+
+    def delete(self, request, *args, **kwargs):
+        return self.apply(request, remove_members)
+
+    def put(self, request, *args, **kwargs):
+        return self.apply(request, replace_members)
     
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def clone_project_view(request, pk):
+    source = get_object_or_404(accessible_projects(request.user), pk=pk)
+    serializer = ProjectCloneSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    options = serializer.validated_data
+    shift_days = options.get('shift_days', 0)
+    if 'start_date' in options:
+        shift_days = (options['start_date'] - source.start_date).days
+
+    project, copied = clone_project(
+        source, request.user,
+        name=options.get('name'),
+        shift_days=shift_days,
+        reset_status=options['reset_status'],
+        members=options['include_members'],
+        documents=options['include_documents'],
+        dependencies=options['include_dependencies'],
+    )
+    return Response({
+        "project": ProjectSerializer(project, context={'request': request}).data,
+        "copied": copied,
+    }, status=status.HTTP_201_CREATED)
+
+
 # Task Views
-class TaskListCreateView(generics.ListCreateAPIView):
+class TaskListCreateView(SparseFieldsMixin, generics.ListCreateAPIView):
     serializer_class = TaskSerializer
     permission_classes = [IsAuthenticated]
 
@@ -128,7 +224,7 @@ class TaskListCreateView(generics.ListCreateAPIView):
         task = serializer.save(created_by=self.request.user)
 
         # create a timeline event for task creation
-        TimelineEvent.objects.create(
+        record_event(
             project=task.project,
             event_type='task_created',
             user=self.request.user,
@@ -136,9 +232,24 @@ class TaskListCreateView(generics.ListCreateAPIView):
         )
     
 
-class TaskDetailView(generics.RetrieveUpdateDestroyAPIView):
+def conflict_response(exc):
+    return Response({
+        "error": str(exc),
+        "status": exc.current['status'],
+        "assigned_to": exc.current['assigned_to_id'],
+        "version": exc.current['version'],
+    }, status=status.HTTP_409_CONFLICT)
+
+
+class TaskDetailView(SparseFieldsMixin, generics.RetrieveUpdateDestroyAPIView):
+    """
+    PUT/PATCH with an ``If-Match: "<version>"`` header only apply while the
+    task is still at that version; otherwise they return 409 with the
+    current values.
+    """
     serializer_class = TaskSerializer
     permission_classes = [IsAuthenticated]
+    expected_version = None
 
     def get_queryset(self):
         return Task.objects.filter(
@@ -147,6 +258,29 @@ class TaskDetailView(generics.RetrieveUpdateDestroyAPIView):
                 models.Q(members=self.request.user)
             )
         )
+
+    def update(self, request, *args, **kwargs):
+        if_match = request.headers.get('If-Match')
+        if if_match is not None:
+            try:
+                self.expected_version = int(if_match.strip().removeprefix('W/').strip('"'))
+            except ValueError:
+                return Response({"error": "If-Match must be a task version."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            return super().update(request, *args, **kwargs)
+        except TransitionConflict as exc:
+            return conflict_response(exc)
+        except Task.DoesNotExist:
+            # deleted between the lookup and the conditional update
+            return Response({"error": "Task not found."}, status=status.HTTP_404_NOT_FOUND)
+
+    def perform_update(self, serializer):
+        if self.expected_version is None:
+            serializer.save()
+            return
+        # the version check happens in the UPDATE itself
+        update_if_version(serializer.instance, serializer.validated_data, self.expected_version)
+        serializer.instance.refresh_from_db()
     
 
 @api_view(['POST'])
@@ -161,32 +295,152 @@ def assign_task(request, task_id):
         user_id = serializer.validated_data['user_id']
         try:
             user = User.objects.get(id=user_id)
-            task.assigned_to = user
-            task.save()
-
-            # create a timeline event for task assignment
-            TimelineEvent.objects.create(
-                project=task.project,
-                event_type='task_assigned',
-                user=request.user,
-                description=f"Task '{task.title}' assigned to {user.username}."
-            )
-
-            # create a notification for the assigned user
-            Notification.objects.create(
-                user=user,
-                title=f"New Task Assigned: {task.title}",
-                message=f"You have been assigned a new task: {task.title} in project {task.project.name}.",
-                is_read=False
-            )
-            return Response(TaskSerializer(task).data, status=status.HTTP_200_OK)
         except User.DoesNotExist:
             return Response({"error": "User does not exist."}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            # conditional UPDATE of the assignee only; the event and the
+            # notification are written when the assignee actually changes
+            transition_task(Task.objects.all(), task.pk, request.user, {'assigned_to': user})
+        except TransitionConflict as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_409_CONFLICT)
+        task.refresh_from_db()
+        return Response(TaskSerializer(task, context={'request': request}).data, status=status.HTTP_200_OK)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def transition_task_view(request, task_id):
+    """
+    Change the status and/or assignee of a task with one conditional UPDATE.
+    ``version`` or ``from_status`` make the change conditional on what the
+    client last saw; a mismatch returns 409 with the current values.
+    """
+    serializer = TaskTransitionSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    data = serializer.validated_data
+
+    changes = {}
+    if 'status' in data:
+        changes['status'] = data['status']
+    if 'assigned_to' in data:
+        changes['assigned_to'] = None
+        if data['assigned_to'] is not None:
+            changes['assigned_to'] = User.objects.filter(pk=data['assigned_to']).first()
+            if changes['assigned_to'] is None:
+                return Response({"error": "User does not exist."}, status=status.HTTP_404_NOT_FOUND)
+
+    queryset = Task.objects.filter(project__in=accessible_projects(request.user))
+    try:
+        changed = transition_task(
+            queryset, task_id, request.user, changes,
+            expected_version=data.get('version'), expected_status=data.get('from_status')
+        )
+    except Task.DoesNotExist:
+        return Response({"error": "Task not found."}, status=status.HTTP_404_NOT_FOUND)
+    except TransitionConflict as exc:
+        return conflict_response(exc)
+
+    task = queryset.filter(pk=task_id).first()
+    if task is None:
+        # deleted or moved out of reach right after the update
+        return Response({"error": "Task not found."}, status=status.HTTP_404_NOT_FOUND)
+    return Response({
+        "changed": changed,
+        "task": TaskSerializer(task, context={'request': request}).data,
+    }, status=status.HTTP_200_OK)
+
+
+class RecurringTaskTemplateListCreateView(SparseFieldsMixin, generics.ListCreateAPIView):
+    serializer_class = RecurringTaskTemplateSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return RecurringTaskTemplate.objects.filter(created_by=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(created_by=self.request.user)
+
+
+class RecurringTaskTemplateDetailView(SparseFieldsMixin, generics.RetrieveUpdateDestroyAPIView):
+    serializer_class = RecurringTaskTemplateSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return RecurringTaskTemplate.objects.filter(created_by=self.request.user)
+
+
+def graph_task(graph, task_id):
+    task = graph.tasks[task_id]
+    return {"id": task['id'], "title": task['title'], "status": task['status'], "due_date": task['due_date']}
+
+
+@api_view(['GET', 'POST', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def task_dependencies(request, task_id):
+    task = get_object_or_404(Task, id=task_id, project__in=accessible_projects(request.user))
+
+    if request.method != 'GET':
+        serializer = TaskDependencySerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        blocker = get_object_or_404(Task, id=serializer.validated_data['blocked_by'], project_id=task.project_id)
+        if request.method == 'POST':
+            try:
+                add_dependency(blocker, task)
+            except DependencyError as exc:
+                return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            # delete() on the queryset skips signals, so go through the instances
+            for dependency in task.blocked_by.filter(blocker=blocker):
+                dependency.delete()
+
+    graph = get_graph(task.project_id)
+    return Response({
+        "task": task.id,
+        "blocked_by": [graph_task(graph, pk) for pk in graph.predecessors.get(task.id, [])],
+        "blocks": [graph_task(graph, pk) for pk in graph.successors.get(task.id, [])],
+    }, status=status.HTTP_201_CREATED if request.method == 'POST' else status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def blocked_tasks(request, pk):
+    project = get_object_or_404(accessible_projects(request.user), pk=pk)
+    graph = get_graph(project.pk)
+    return Response([
+        {**graph_task(graph, task_id), "blocked_by": blockers}
+        for task_id, blockers in graph.blocked()
+    ])
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def topological_order(request, pk):
+    project = get_object_or_404(accessible_projects(request.user), pk=pk)
+    graph = get_graph(project.pk)
+    try:
+        order = graph.topological_order()
+    except DependencyError as exc:
+        return Response({"error": str(exc)}, status=status.HTTP_409_CONFLICT)
+    return Response([graph_task(graph, task_id) for task_id in order])
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def critical_path(request, pk):
+    project = get_object_or_404(accessible_projects(request.user), pk=pk)
+    graph = get_graph(project.pk)
+    try:
+        path, days = graph.critical_path()
+    except DependencyError as exc:
+        return Response({"error": str(exc)}, status=status.HTTP_409_CONFLICT)
+    return Response({"days": days, "tasks": [graph_task(graph, task_id) for task_id in path]})
+
+
 # Document Views
-class DocumentListCreateView(generics.ListCreateAPIView):
+class DocumentListCreateView(SparseFieldsMixin, generics.ListCreateAPIView):
     serializer_class = DocumentSerializer
     permission_classes = [IsAuthenticated]
 
@@ -206,7 +460,7 @@ class DocumentListCreateView(generics.ListCreateAPIView):
         document = serializer.save(uploaded_by=self.request.user)
 
         # create a timeline event for document upload
-        TimelineEvent.objects.create(
+        record_event(
             project=document.project,
             event_type='document_uploaded',
             user=self.request.user,
@@ -214,7 +468,7 @@ class DocumentListCreateView(generics.ListCreateAPIView):
         )
 
 
-class DocumentDetailView(generics.RetrieveUpdateDestroyAPIView):
+class DocumentDetailView(SparseFieldsMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = DocumentSerializer
     permission_classes = [IsAuthenticated]
 
@@ -228,7 +482,7 @@ class DocumentDetailView(generics.RetrieveUpdateDestroyAPIView):
     
 
 # Comment Views
-class CommentListCreateView(generics.ListCreateAPIView):
+class CommentListCreateView(SparseFieldsMixin, generics.ListCreateAPIView):
     serializer_class = CommentSerializer
     permission_classes = [IsAuthenticated]
 
@@ -254,14 +508,14 @@ class CommentListCreateView(generics.ListCreateAPIView):
         comment = serializer.save(author=self.request.user)
         # Create timeline event
         project = comment.project or comment.task.project
-        TimelineEvent.objects.create(
+        record_event(
             project=project,
             event_type='comment_added',
             description=f'Comment was added by {self.request.user.username}',
             user=self.request.user
         )
 
-class CommentDetailView(generics.RetrieveUpdateDestroyAPIView):
+class CommentDetailView(SparseFieldsMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = CommentSerializer
     permission_classes = [IsAuthenticated]
 
@@ -269,7 +523,7 @@ class CommentDetailView(generics.RetrieveUpdateDestroyAPIView):
         return Comment.objects.filter(author=self.request.user)
 
 # Timeline Views
-class TimelineEventListView(generics.ListAPIView):
+class TimelineEventListView(SparseFieldsMixin, generics.ListAPIView):
     serializer_class = TimelineEventSerializer
     permission_classes = [IsAuthenticated]
 
@@ -285,8 +539,24 @@ class TimelineEventListView(generics.ListAPIView):
             queryset = queryset.filter(project_id=project_id)
         return queryset
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def feed_view(request):
+    try:
+        limit = min(int(request.query_params.get('page_size', settings.FEED_PAGE_SIZE)), settings.FEED_MAX_PAGE_SIZE)
+    except ValueError:
+        return Response({"error": "Invalid page_size."}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        page = build_feed(request, request.query_params.get('cursor'), limit=max(limit, 1))
+    except InvalidFeedCursor as exc:
+        return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    if page['next'] is not None:
+        page['next'] = replace_query_param(request.build_absolute_uri(), 'cursor', page['next'])
+    return Response(page, status=status.HTTP_200_OK)
+
+
 # Notification Views
-class NotificationListView(generics.ListAPIView):
+class NotificationListView(SparseFieldsMixin, generics.ListAPIView):
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
 
@@ -303,6 +573,22 @@ def mark_notification_read(request, notification_id):
     )
     notification.is_read = True
     notification.save()
-    return Response(NotificationSerializer(notification).data)
+    return Response(NotificationSerializer(notification, context={'request': request}).data)
+
+
+# Sync Views
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def sync_view(request):
+    try:
+        data = build_sync(request, request.query_params.get('since'))
+    except InvalidSyncToken as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(data)
 
 
+# Metrics Views
+@api_view(['GET'])
+@permission_classes([HasMetricsAccess])
+def metrics_view(request):
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
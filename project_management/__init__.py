@@ -0,0 +1,7 @@
+try:
+    from .celery import app as celery_app
+except ImportError:
+    # without celery the periodic jobs run as management commands from cron
+    celery_app = None
+
+__all__ = ('celery_app',)
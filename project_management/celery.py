@@ -0,0 +1,11 @@
+import os
+
+from celery import Celery
+
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project_management.settings')
+
+app = Celery('project_management')
+# every CELERY_* setting, CELERY_BEAT_SCHEDULE included
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -12,7 +12,10 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 
 from pathlib import Path
 import os
+import sys
+import tempfile
 from datetime import timedelta
+from importlib.util import find_spec
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -46,12 +49,16 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'project_app.middleware.InstrumentationMiddleware',
+    'project_app.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'project_app.middleware.ReplicaRoutingMiddleware',
+    'project_app.middleware.TimelineBufferMiddleware',
 ]
 
 ROOT_URLCONF = 'project_management.urls'
@@ -82,7 +89,43 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    # Read replica stand-in. Point it at a real replica in production; the
+    # tests use a separate SQLite file so routing can be observed. It lives in
+    # the temp directory so an interrupted run leaves nothing in the checkout.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'TEST': {
+            'NAME': Path(tempfile.gettempdir()) / 'project_management_test_replica.sqlite3',
+        },
+    },
+}
+
+DATABASE_ROUTERS = ['project_app.routers.ReplicaRouter']
+
+# Aliases from DATABASES that project_app reads are spread over. Empty means
+# every query goes to the primary.
+DATABASE_REPLICAS = []
+
+# How long a user keeps reading from the primary after writing.
+DATABASE_REPLICA_STICKY_SECONDS = 5
+
+
+# Cache
+# Replica stickiness and the cached task graphs must be seen by every worker,
+# so production points CACHE_URL at Redis. The per-process fallback is only
+# fit for a single dev server; the project_app checks refuse it once
+# DATABASE_REPLICAS is set.
+CACHE_URL = os.environ.get('CACHE_URL')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_URL,
+    } if CACHE_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
 }
 
 
@@ -137,10 +180,142 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'project_app.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
 }
 
+# MessagePack is offered through content negotiation when msgpack is installed
+if find_spec('msgpack') is not None:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append('project_app.renderers.MessagePackRenderer')
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'].append('project_app.renderers.MessagePackParser')
+
+# Responses smaller than this are not compressed. Brotli is used when the
+# brotli package is installed, the client accepts it and sent no cookies;
+# gzip (Django's, with BREACH padding) otherwise.
+RESPONSE_COMPRESSION_MIN_SIZE = 1024
+RESPONSE_COMPRESSION_BROTLI_QUALITY = 5
+
+# Timeline events are buffered per process and written in bulk once this many
+# are pending, once the oldest is this many seconds old, or when a request
+# ends. DURABLE flushes before the response is returned instead of after.
+# Events that fail to insert are retried for MAX_ATTEMPTS flushes and at most
+# MAX_PENDING are held, then they are dropped and logged.
+TIMELINE_BUFFER_SIZE = 100
+TIMELINE_BUFFER_MAX_AGE = 1.0
+TIMELINE_BUFFER_DURABLE = False
+TIMELINE_BUFFER_MAX_ATTEMPTS = 3
+TIMELINE_BUFFER_MAX_PENDING = 10000
+
+# Retention for the append-only activity tables, see project_app/retention.py
+TIMELINE_RETENTION_DAYS = 365
+NOTIFICATION_RETENTION_DAYS = 180
+NOTIFICATION_READ_RETENTION_DAYS = 30
+RETENTION_BATCH_SIZE = 1000
+RETENTION_ARCHIVE_DIR = os.path.join(BASE_DIR, 'archive')
+
+# Members embedded in each project representation; the rest are served by
+# /api/projects/<id>/members/ or ?expand=members.
+PROJECT_MEMBERS_PREVIEW_SIZE = 5
+
+# Rows per INSERT when cloning a project (/api/projects/<id>/clone/)
+PROJECT_CLONE_BATCH_SIZE = 1000
+
+# Activity feed (/api/feed/). Users who can see at least
+# FEED_PRECOMPUTE_MIN_PROJECTS projects get a feed filled on write, seeded
+# with the FEED_PRECOMPUTE_BACKFILL latest events; None turns that off.
+FEED_PAGE_SIZE = 50
+FEED_MAX_PAGE_SIZE = 200
+FEED_PRECOMPUTE_MIN_PROJECTS = 50
+FEED_PRECOMPUTE_BACKFILL = 500
+
+# Admin changelists show the planner's row estimate instead of an exact
+# COUNT(*) for unfiltered tables larger than this (Postgres only).
+ADMIN_EXACT_COUNT_LIMIT = 100000
+
+# Delta sync (/api/sync/): rows per type per response, how far behind "now"
+# the cursors stay so late commits are not skipped, and how long tombstones
+# of deleted rows are kept. Older sync tokens get a full resync.
+SYNC_PAGE_SIZE = 500
+SYNC_LAG_SECONDS = 2
+SYNC_TOMBSTONE_RETENTION_DAYS = 90
+
+# Recurring task templates are materialized this many days ahead by
+# generate_recurring_tasks (cron or the Celery beat entries below). Missed
+# windows are caught up for at most CATCHUP_DAYS.
+RECURRING_TASK_HORIZON_DAYS = 7
+RECURRING_TASK_CATCHUP_DAYS = 31
+RECURRING_TASK_BATCH_SIZE = 1000
+
+# Due-date digests (send_task_reminders): assignees hear once about tasks due
+# within DUE_SOON_DAYS and once more when they become overdue, for up to
+# OVERDUE_DAYS after the due date.
+REMINDER_DUE_SOON_DAYS = 2
+REMINDER_OVERDUE_DAYS = 14
+REMINDER_DIGEST_MAX_ITEMS = 20
+REMINDER_BATCH_SIZE = 1000
+
+# Celery app in project_management/celery.py; run a worker with beat
+# (celery -A project_management worker --beat) to get the periodic jobs below.
+# Without celery, run the management command of each job from cron instead.
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
+CELERY_TIMEZONE = TIME_ZONE
+CELERY_TASK_IGNORE_RESULT = True
+
+CELERY_BEAT_SCHEDULE = {
+    'generate-recurring-tasks': {
+        'task': 'project_app.tasks.generate_recurring_tasks',
+        'schedule': 3600,
+    },
+    'send-task-reminders': {
+        'task': 'project_app.tasks.send_task_reminders',
+        'schedule': 3600,
+    },
+}
+
+# Per-request query/timing instrumentation. A SLOW_REQUEST_SAMPLE_RATE share
+# of requests keeps its SQL so slow ones can be logged with it; 0 turns the
+# capture off. /api/_metrics accepts staff users or METRICS_TOKEN sent as
+# the X-Metrics-Token header.
+REQUEST_METRICS_ENABLED = True
+SLOW_REQUEST_MS = 500
+SLOW_REQUEST_SAMPLE_RATE = 0.0
+SLOW_REQUEST_MAX_QUERIES = 20
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Task dependency graphs are cached per project for the read endpoints
+# (blocked, order, critical path) and invalidated on every change. Across
+# workers that takes the shared cache configured above.
+TASK_GRAPH_CACHE_SECONDS = 300
+
+# One JSON line per request on project_app.requests (INFO) and slow requests
+# with their SQL on project_app.slow_requests (WARNING), both to stderr. The
+# per-request lines are left out of test runs.
+REQUEST_LOG_LEVEL = os.environ.get('REQUEST_LOG_LEVEL', 'WARNING' if sys.argv[1:2] == ['test'] else 'INFO')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {'format': '%(asctime)s %(name)s %(levelname)s %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'plain'},
+    },
+    'loggers': {
+        'project_app.requests': {'handlers': ['console'], 'level': REQUEST_LOG_LEVEL, 'propagate': False},
+        'project_app.slow_requests': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
 # Simple JWT settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),